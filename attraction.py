@@ -0,0 +1,122 @@
+import numpy as np
+
+import v3
+from v3 import WIDTH, HEIGHT, MIN_RADIUS, MAX_RADIUS, MAX_VEL
+
+
+# Attraction variables, masses are proportional to the squared radius
+STRENGTH = 2000.0
+THETA = 0.7
+# Quadtree levels, and softening length keeping the pull of overlapping spheres finite
+DEPTH = 10
+SOFTENING = 30.0
+
+
+def morton(x, y, depth=DEPTH):
+    """Interleave the bits of two integer coordinates below 2**depth into one Z order key"""
+    def spread(v):
+        v = v.astype(np.uint64)
+        v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+        v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+        return v
+    return spread(x) | (spread(y) << np.uint64(1))
+
+
+class QuadTree:
+    """Linear quadtree over points sorted in Z order, every level stored as flat node arrays
+
+    Node n covers the sorted points first[n]:first[n] + count[n], its children are the
+    nodes child[n]:child_end[n] of the next level. Node ids run level by level from the root.
+    """
+    def __init__(self, points, masses, depth=DEPTH):
+        low = points.min(axis=0)
+        self.size = max(np.max(points.max(axis=0) - low), 1e-9) * (1 + 1e-9)
+        cells = ((points - low) / self.size * (1 << depth)).astype(np.int64)
+        codes = morton(cells[:, 0], cells[:, 1], depth)
+        order = np.argsort(codes, kind="stable")
+        codes, points, masses = codes[order], points[order], masses[order]
+
+        first, level = [], []
+        for d in range(depth + 1):
+            keys = codes >> np.uint64(2 * (depth - d))
+            starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+            first.append(starts)
+            level.append(np.full(len(starts), d))
+
+        offsets = np.cumsum([0] + [len(starts) for starts in first])
+        child, child_end = [], []
+        for d in range(depth + 1):
+            if d == depth:
+                child.append(np.zeros(len(first[d]), dtype=np.int64))
+                child_end.append(child[-1])
+                continue
+            ends = np.append(first[d][1:], len(codes))
+            child.append(offsets[d + 1] + np.searchsorted(first[d + 1], first[d]))
+            child_end.append(offsets[d + 1] + np.searchsorted(first[d + 1], ends))
+
+        self.first = np.concatenate(first)
+        self.count = np.concatenate([np.diff(np.append(starts, len(codes))) for starts in first])
+        self.level = np.concatenate(level)
+        self.child, self.child_end = np.concatenate(child), np.concatenate(child_end)
+        # Squared node width, zero for leaves so they are never opened
+        leaf = (self.count == 1) | (self.level == depth)
+        self.opening = np.where(leaf, 0, (self.size / (1 << self.level)) ** 2)
+
+        self.mass = np.add.reduceat(masses, self.first)
+        self.cx = np.add.reduceat(points[:, 0] * masses, self.first) / self.mass
+        self.cy = np.add.reduceat(points[:, 1] * masses, self.first) / self.mass
+
+    def accelerations(self, points, strength=STRENGTH, theta=THETA, softening=SOFTENING):
+        """Barnes-Hut attraction on every point, walking all (point, node) pairs of a level at once"""
+        ax, ay = np.zeros(len(points)), np.zeros(len(points))
+        x, y = points[:, 0], points[:, 1]
+        body = np.arange(len(points))
+        node = np.zeros(len(points), dtype=np.int64)
+        while len(body):
+            dx = self.cx[node] - x[body]
+            dy = self.cy[node] - y[body]
+            distance2 = dx * dx + dy * dy
+            opened = self.opening[node] > theta**2 * distance2
+
+            done = ~opened
+            b, n, d2 = body[done], node[done], distance2[done]
+            scale = strength * self.mass[n] / ((d2 + softening**2) * np.sqrt(d2 + softening**2)) * (d2 > 0)
+            ax += np.bincount(b, scale * dx[done], len(points))
+            ay += np.bincount(b, scale * dy[done], len(points))
+
+            # Opened nodes hand their pairs on to their children
+            body, node = body[opened], node[opened]
+            counts = self.child_end[node] - self.child[node]
+            body = np.repeat(body, counts)
+            node = _ranges(self.child[node], counts)
+        return np.column_stack((ax, ay))
+
+
+def _ranges(starts, counts):
+    """Concatenated aranges starts[i]:starts[i] + counts[i]"""
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+
+
+class Spheres(v3.Spheres):
+    """Version 3 spheres pulling on each other, with speeds capped at MAX_VEL so blobs drift together"""
+    def __init__(self, num_spheres=v3.NUM_SPHERES, strength=STRENGTH, theta=THETA):
+        self.spheres = np.column_stack((
+            np.random.rand(num_spheres) * WIDTH,
+            np.random.rand(num_spheres) * HEIGHT,
+            MIN_RADIUS + np.random.rand(num_spheres) * (MAX_RADIUS - MIN_RADIUS),
+        ))
+        self.velocities = np.random.rand(num_spheres, 2) * MAX_VEL
+        self.strength = strength
+        self.theta = theta
+
+    def update(self, elapsed_time):
+        points = self.spheres[:, 0:2]
+        tree = QuadTree(points, self.spheres[:, 2] ** 2)
+        self.velocities += tree.accelerations(points, self.strength, self.theta) * elapsed_time
+
+        speed = np.sqrt(np.sum(self.velocities**2, axis=1))
+        self.velocities *= np.minimum(1, MAX_VEL / np.maximum(speed, 1e-12))[:, None]
+        super().update(elapsed_time)
@@ -0,0 +1,91 @@
+import time
+import numpy as np
+
+import field
+import contour
+from export import BinaryExporter
+from v3 import WIDTH, HEIGHT, NUM_SPHERES, MIN_RADIUS, MAX_RADIUS, MAX_VEL
+
+
+# Batch variables
+SCENES = 256
+FRAMES = 120
+FRAME_TIME = 1 / 60
+SQUARE_SIZE = 10
+THRESHOLD = 2
+# Grid rows evaluated at once, a tile holds SCENES * NUM_SPHERES * TILE_ROWS * cols values
+TILE_ROWS = 2
+
+
+class Spheres:
+    """K independent scenes of spheres, rows of self.spheres[k] are [x, y, radius] as in Version 3"""
+    def __init__(self, scenes, num_spheres=NUM_SPHERES):
+        shape = (scenes, num_spheres)
+        self.spheres = np.stack((
+            np.random.rand(*shape) * WIDTH,
+            np.random.rand(*shape) * HEIGHT,
+            MIN_RADIUS + np.random.rand(*shape) * (MAX_RADIUS - MIN_RADIUS),
+        ), axis=-1)
+        self.velocities = np.random.rand(scenes, num_spheres, 2) * MAX_VEL
+
+    def update(self, elapsed_time):
+        self.spheres[..., 0:2] += self.velocities * elapsed_time
+
+        x_collision = ((self.spheres[..., 0] >= WIDTH) & (self.velocities[..., 0] > 0)) | ((self.spheres[..., 0] <= 0) & (self.velocities[..., 0] < 0))
+        self.velocities[..., 0][x_collision] *= -1
+
+        y_collision = ((self.spheres[..., 1] >= HEIGHT) & (self.velocities[..., 1] > 0)) | ((self.spheres[..., 1] <= 0) & (self.velocities[..., 1] < 0))
+        self.velocities[..., 1][y_collision] *= -1
+
+
+def evaluate(spheres, xs, ys, tile_rows=TILE_ROWS):
+    """Field of every scene as a (K, rows, cols) array, evaluated over all scenes and spheres in row tiles"""
+    dx2 = (spheres[..., 0, None] - xs) ** 2
+    dy2 = (spheres[..., 1, None] - ys) ** 2
+    radius = spheres[..., 2, None, None]
+
+    values = np.empty((len(spheres), len(ys), len(xs)))
+    buffer = np.empty(spheres.shape[:2] + (tile_rows, len(xs)))
+    for start in range(0, len(ys), tile_rows):
+        stop = min(start + tile_rows, len(ys))
+        distances = buffer[:, :, :stop - start]
+        np.add(dy2[..., start:stop, None], dx2[..., None, :], out=distances)
+        np.sqrt(distances, out=distances)
+        distances += field.EPSILON
+        np.divide(radius, distances, out=distances)
+        distances.sum(axis=1, out=values[:, start:stop])
+    return values
+
+
+def segments(fields, threshold, xs, ys):
+    """Contour segments of every scene, classified in one pass over the stacked fields"""
+    edges, index = contour.code_segments(contour.case_codes(fields, threshold), fields.shape[-2:])
+    order = np.argsort(index[0], kind="stable")
+    splits = np.cumsum(np.bincount(index[0], minlength=len(fields)))[:-1]
+    return [
+        contour.edge_points(scene_field, threshold, xs, ys, scene_edges.ravel()).reshape(-1, 2, 2)
+        for scene_field, scene_edges in zip(fields, np.split(edges[order], splits))
+    ]
+
+
+def simulate(spheres, frames, elapsed_time=FRAME_TIME, threshold=THRESHOLD, size=SQUARE_SIZE):
+    """Yield the per scene segments of every frame"""
+    xs, ys = field.grid(WIDTH, HEIGHT, size)
+    for _ in range(frames):
+        spheres.update(elapsed_time)
+        yield segments(evaluate(spheres.spheres, xs, ys), threshold, xs, ys)
+
+
+if __name__ == "__main__":
+    spheres = Spheres(SCENES)
+    writers = [BinaryExporter(f"scene_{k:05d}.bin") for k in range(SCENES)]
+
+    start_time = time.time()
+    for frame in simulate(spheres, FRAMES):
+        for writer, scene in zip(writers, frame):
+            writer.write(list(scene))
+    for writer in writers:
+        writer.close()
+
+    elapsed = time.time() - start_time
+    print(f"{SCENES} scenes x {FRAMES} frames in {elapsed:.2f}s ({SCENES * FRAMES / elapsed:.0f} scene frames/s)")
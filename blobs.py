@@ -0,0 +1,119 @@
+import numpy as np
+
+import contour
+
+
+def connections(field, threshold):
+    """Pairs of flat vertex indices joining inside vertices, as marching squares connects them
+
+    Inside vertices are linked to their inside neighbours along the grid, and across
+    the diagonal of saddle cells whose centre is inside, so every component is bounded
+    by exactly the contour loops drawn for it.
+    """
+    inside = field >= threshold
+    n_rows, n_cols = field.shape
+    index = np.arange(field.size).reshape(field.shape)
+    pairs = [
+        (index[:, :-1][inside[:, :-1] & inside[:, 1:]], index[:, 1:][inside[:, :-1] & inside[:, 1:]]),
+        (index[:-1, :][inside[:-1, :] & inside[1:, :]], index[1:, :][inside[:-1, :] & inside[1:, :]]),
+    ]
+    code = contour.case_codes(field, threshold)
+    rows, cols = np.nonzero(code == 21)
+    pairs.append((index[rows, cols], index[rows + 1, cols + 1]))
+    rows, cols = np.nonzero(code == 26)
+    pairs.append((index[rows, cols + 1], index[rows + 1, cols]))
+    return np.concatenate([a for a, _ in pairs]), np.concatenate([b for _, b in pairs])
+
+
+def union_find(n, a, b):
+    """Root of every node after joining all (a, b) pairs, with vectorized hooking and pointer jumping
+
+    Every round hooks the larger root of each joined pair onto the smaller one and then
+    compresses all paths, so the work per round is linear and the number of rounds is small.
+    """
+    parent = np.arange(n)
+    while True:
+        root_a, root_b = parent[a], parent[b]
+        differ = root_a != root_b
+        if not np.any(differ):
+            return parent
+        low, high = np.minimum(root_a[differ], root_b[differ]), np.maximum(root_a[differ], root_b[differ])
+        np.minimum.at(parent, high, low)
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+
+def label(field, threshold):
+    """Component label of every vertex, 0 outside and 1..count inside, and the count"""
+    inside = (field >= threshold).ravel()
+    parent = union_find(field.size, *connections(field, threshold))
+    labels = np.zeros(field.size, dtype=np.intp)
+    roots, labels[inside] = np.unique(parent[inside], return_inverse=True)
+    labels[inside] += 1
+    return labels.reshape(field.shape), len(roots)
+
+
+def overlaps(previous, labels):
+    """Pairs of (previous label, current label) sharing inside vertices, with their vertex counts"""
+    both = (previous > 0) & (labels > 0)
+    keys = previous[both].astype(np.int64) * (labels.max() + 1) + labels[both]
+    keys, counts = np.unique(keys, return_counts=True)
+    return keys // (labels.max() + 1), keys % (labels.max() + 1), counts
+
+
+class Tracker:
+    """Keeps blob ids across frames by overlap of their inside vertices
+
+    A blob takes over the id of the previous blob it overlaps most, unless another blob
+    overlaps that one more. Events are ("merge", old ids, new id), ("split", old id,
+    new ids), ("appear", None, new id) and ("vanish", old id, None).
+    """
+    def __init__(self):
+        self.labels = None
+        self.ids = np.zeros(1, dtype=np.intp)
+        self.next_id = 1
+
+    def update(self, field, threshold):
+        """Blob id of every vertex (0 outside) and the events since the last frame"""
+        labels, count = label(field, threshold)
+        ids = np.zeros(count + 1, dtype=np.intp)
+        events = []
+        if self.labels is None or self.labels.shape != labels.shape:
+            old, new, weight = (np.empty(0, dtype=np.intp),) * 3
+        else:
+            old, new, weight = overlaps(self.labels, labels)
+
+        # Strongest overlaps first, every previous blob passes its id on once
+        taken = set()
+        for i in np.argsort(-weight, kind="stable"):
+            if ids[new[i]] == 0 and old[i] not in taken:
+                ids[new[i]] = self.ids[old[i]]
+                taken.add(old[i])
+        fresh = np.flatnonzero(ids[1:] == 0) + 1
+        ids[fresh] = np.arange(self.next_id, self.next_id + len(fresh))
+        self.next_id += len(fresh)
+
+        sources = {}
+        targets = {}
+        for o, n in zip(old.tolist(), new.tolist()):
+            sources.setdefault(n, []).append(int(self.ids[o]))
+            targets.setdefault(o, []).append(int(ids[n]))
+        for n, previous in sources.items():
+            if len(previous) > 1:
+                events.append(("merge", sorted(previous), int(ids[n])))
+        for o, current in targets.items():
+            if len(current) > 1:
+                events.append(("split", int(self.ids[o]), sorted(current)))
+        for n in range(1, count + 1):
+            if n not in sources:
+                events.append(("appear", None, int(ids[n])))
+        if self.labels is not None:
+            for o in range(1, len(self.ids)):
+                if o not in targets:
+                    events.append(("vanish", int(self.ids[o]), None))
+
+        self.labels, self.ids = labels, ids
+        return ids[labels], events
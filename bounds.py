@@ -0,0 +1,84 @@
+import numpy as np
+
+import field
+
+
+# Tile sizes in cells, from the coarse pass down to the tiles whose vertices get evaluated.
+# Every size has to be a multiple of the next one.
+TILE_LEVELS = (32, 8)
+
+
+def sphere_bounds(spheres, x0, x1, y0, y1):
+    """Lower and upper bound of every sphere's contribution over every box, as (boxes, spheres) arrays"""
+    sx, sy, radius = spheres[:, 0], spheres[:, 1], spheres[:, 2]
+    near_x = np.maximum(np.maximum(x0[:, None] - sx, sx - x1[:, None]), 0)
+    near_y = np.maximum(np.maximum(y0[:, None] - sy, sy - y1[:, None]), 0)
+    far_x = np.maximum(np.abs(sx - x0[:, None]), np.abs(sx - x1[:, None]))
+    far_y = np.maximum(np.abs(sy - y0[:, None]), np.abs(sy - y1[:, None]))
+
+    lower = radius / (np.sqrt(far_x**2 + far_y**2) + field.EPSILON)
+    upper = radius / (np.sqrt(near_x**2 + near_y**2) + field.EPSILON)
+    return lower, upper
+
+
+def tile_bounds(spheres, x0, x1, y0, y1):
+    """Lower and upper bound of the field over every box, from each sphere's farthest and nearest point"""
+    lower, upper = sphere_bounds(spheres, x0, x1, y0, y1)
+    return np.sum(lower, axis=1), np.sum(upper, axis=1)
+
+
+def blocks(rows, cols, size, step=None):
+    """Row and column indices of the size x size block starting at every (row, col) * step"""
+    step = size if step is None else step
+    offsets = np.arange(size)
+    block_rows = rows[:, None, None] * step + offsets[None, :, None]
+    block_cols = cols[:, None, None] * step + offsets[None, None, :]
+    block_rows, block_cols = np.broadcast_arrays(block_rows, block_cols)
+    return block_rows.ravel(), block_cols.ravel()
+
+
+def evaluate(spheres, xs, ys, thresholds, levels=TILE_LEVELS):
+    """Field classified tile by tile, evaluating vertices only in tiles a threshold may cross
+
+    Tiles whose bounds contain no threshold are filled with their lower bound, which
+    lies on the same side of every threshold as the exact values. Returns the field
+    and the number of vertices that were evaluated, counting the borders shared by
+    neighbouring tiles once per tile.
+    """
+    thresholds = np.sort(np.atleast_1d(thresholds))
+    n_rows, n_cols = len(ys) - 1, len(xs) - 1
+    finest = levels[-1]
+    fill = np.full((-(-n_rows // finest), -(-n_cols // finest)), np.nan)
+
+    span = levels[0]
+    rows, cols = np.meshgrid(np.arange(-(-n_rows // span)), np.arange(-(-n_cols // span)), indexing="ij")
+    rows, cols = rows.ravel(), cols.ravel()
+    for level, span in enumerate(levels):
+        r0, c0 = rows * span, cols * span
+        r1, c1 = np.minimum(r0 + span, n_rows), np.minimum(c0 + span, n_cols)
+        lower, upper = tile_bounds(spheres, xs[c0], xs[c1], ys[r0], ys[r1])
+        crossed = np.searchsorted(thresholds, upper, "right") > np.searchsorted(thresholds, lower, "left")
+
+        fine_rows, fine_cols = blocks(rows[~crossed], cols[~crossed], span // finest)
+        value = np.repeat(lower[~crossed], (span // finest) ** 2)
+        keep = (fine_rows < fill.shape[0]) & (fine_cols < fill.shape[1])
+        fill[fine_rows[keep], fine_cols[keep]] = value[keep]
+
+        rows, cols = rows[crossed], cols[crossed]
+        if level + 1 < len(levels):
+            rows, cols = blocks(rows, cols, span // levels[level + 1])
+            keep = (rows * levels[level + 1] < n_rows) & (cols * levels[level + 1] < n_cols)
+            rows, cols = rows[keep], cols[keep]
+
+    # Decided tiles spread their fill to their vertices, the rest is evaluated exactly
+    vertex_rows = np.minimum(np.arange(n_rows + 1) // finest, fill.shape[0] - 1)
+    vertex_cols = np.minimum(np.arange(n_cols + 1) // finest, fill.shape[1] - 1)
+    values = fill[vertex_rows[:, None], vertex_cols[None, :]]
+
+    # Every remaining tile as one dense block of its (finest + 1)**2 vertices, clamped to the grid
+    offsets = np.arange(finest + 1)
+    v_rows = np.minimum(rows[:, None] * finest + offsets, n_rows)
+    v_cols = np.minimum(cols[:, None] * finest + offsets, n_cols)
+    values[v_rows[:, :, None], v_cols[:, None, :]] = field.evaluate_tiles(spheres, xs[v_cols], ys[v_rows])
+    evaluated = np.sum((v_rows[:, -1] - v_rows[:, 0] + 1) * (v_cols[:, -1] - v_cols[:, 0] + 1))
+    return values, int(evaluated)
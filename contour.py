@@ -0,0 +1,318 @@
+import numpy as np
+
+
+# Corner bits of a cell: top-left, top-right, bottom-right, bottom-left
+# Local edges of a cell: 0 top, 1 right, 2 bottom, 3 left
+CORNERS = np.array([(0, 0), (1, 0), (1, 1), (0, 1)], dtype=np.float64)
+EDGE_MIDPOINTS = np.array([(0.5, 0), (1, 0.5), (0.5, 1), (0, 0.5)], dtype=np.float64)
+
+# Saddle cases 5 and 10 get a second variant (code + 16) used when the cell centre is inside
+CASE_EDGES = {
+    1: [(3, 0)], 2: [(0, 1)], 3: [(3, 1)], 4: [(1, 2)],
+    5: [(3, 0), (1, 2)], 6: [(0, 2)], 7: [(3, 2)], 8: [(2, 3)],
+    9: [(0, 2)], 10: [(0, 1), (2, 3)], 11: [(1, 2)], 12: [(1, 3)],
+    13: [(0, 1)], 14: [(3, 0)],
+    21: [(0, 1), (2, 3)], 26: [(3, 0), (1, 2)],
+}
+
+
+def _orient(case, a, b):
+    """Order an edge pair so the inside of the contour lies on the right in screen coordinates"""
+    start, end = EDGE_MIDPOINTS[a], EDGE_MIDPOINTS[b]
+    middle = (start + end) / 2
+    corner = np.argmin(np.sum((CORNERS - middle) ** 2, axis=1))
+    direction, offset = end - start, CORNERS[corner] - start
+    cross = direction[0] * offset[1] - direction[1] * offset[0]
+    inside = bool(case & (1 << corner))
+    return (a, b) if (cross > 0) == inside else (b, a)
+
+
+def _build_tables():
+    count = np.zeros(32, dtype=np.intp)
+    starts = np.zeros((32, 2), dtype=np.intp)
+    ends = np.zeros((32, 2), dtype=np.intp)
+    for code, pairs in CASE_EDGES.items():
+        count[code] = len(pairs)
+        for i, (a, b) in enumerate(pairs):
+            starts[code, i], ends[code, i] = _orient(code & 15, a, b)
+    return count, starts, ends
+
+
+SEGMENT_COUNT, SEGMENT_START, SEGMENT_END = _build_tables()
+
+
+def cases(field, threshold):
+    """Marching squares case index (0-15) of every cell, fields may be stacked along leading axes"""
+    inside = field >= threshold
+    return (inside[..., :-1, :-1] * 1 | inside[..., :-1, 1:] * 2 | inside[..., 1:, 1:] * 4 | inside[..., 1:, :-1] * 8).astype(np.uint8)
+
+
+def case_codes(field, threshold, case=None):
+    """Case indices with saddle cells whose centre is inside moved to their +16 variant"""
+    if case is None:
+        case = cases(field, threshold)
+    code = case.astype(np.intp)
+    index = np.nonzero((case == 5) | (case == 10))
+    if len(index[0]):
+        *lead, rows, cols = index
+        centre = (
+            field[(*lead, rows, cols)] + field[(*lead, rows, cols + 1)]
+            + field[(*lead, rows + 1, cols + 1)] + field[(*lead, rows + 1, cols)]
+        ) / 4
+        code[index] += 16 * (centre >= threshold)
+    return code
+
+
+def cell_edges(rows, cols, shape):
+    """Global ids of the top, right, bottom and left edge of the given cells"""
+    n_rows, n_cols = shape
+    n_horizontal = n_rows * (n_cols - 1)
+    return np.stack((
+        rows * (n_cols - 1) + cols,
+        n_horizontal + rows * n_cols + cols + 1,
+        (rows + 1) * (n_cols - 1) + cols,
+        n_horizontal + rows * n_cols + cols,
+    ), axis=-1)
+
+
+def code_segments(code, shape):
+    """Oriented edge id pairs of all cells in a (..., rows, cols) code array and the index of their cell"""
+    count = SEGMENT_COUNT[code]
+    index = np.nonzero(count)
+    code, count = code[index], count[index]
+    local = cell_edges(index[-2], index[-1], shape)
+
+    single = np.arange(len(code))
+    double = np.nonzero(count == 2)[0]
+    first = np.column_stack((local[single, SEGMENT_START[code, 0]], local[single, SEGMENT_END[code, 0]]))
+    second = np.column_stack((local[double, SEGMENT_START[code[double], 1]], local[double, SEGMENT_END[code[double], 1]]))
+    owner = np.concatenate((single, double))
+    return np.concatenate((first, second)).astype(np.int64), tuple(i[owner] for i in index)
+
+
+def segment_edges(field, threshold, code=None):
+    """Oriented segments as (M, 2) pairs of edge ids; each segment ends where the next one starts"""
+    if code is None:
+        code = case_codes(field, threshold)
+    return code_segments(code, field.shape)[0]
+
+
+def edge_vertices(shape, ids):
+    """Row and column of the first and second vertex of every edge id"""
+    n_rows, n_cols = shape
+    n_horizontal = n_rows * (n_cols - 1)
+    ids = np.asarray(ids, dtype=np.int64)
+    vertical = ids >= n_horizontal
+
+    rows, cols = np.divmod(ids, n_cols - 1)
+    v_rows, v_cols = np.divmod(ids - n_horizontal, n_cols)
+    rows = np.where(vertical, v_rows, rows)
+    cols = np.where(vertical, v_cols, cols)
+    return rows, cols, rows + vertical, cols + ~vertical
+
+
+def edge_points(field, threshold, xs, ys, ids):
+    """Linearly interpolated crossing point on each of the given edges
+
+    Functions with this signature can be passed as locate to the contour builders below.
+    """
+    rows, cols, rows2, cols2 = edge_vertices(field.shape, ids)
+    f0, f1 = field[rows, cols], field[rows2, cols2]
+    t = (threshold - f0) / (f1 - f0)
+    x = xs[cols] + (xs[cols2] - xs[cols]) * t
+    y = ys[rows] + (ys[rows2] - ys[rows]) * t
+    return np.column_stack((x, y))
+
+
+def segments(field, threshold, xs, ys, locate=edge_points):
+    """Contour segments as an (M, 2, 2) array of start and end points"""
+    edges = segment_edges(field, threshold)
+    return locate(field, threshold, xs, ys, edges.ravel()).reshape(-1, 2, 2)
+
+
+def chain(edges):
+    """Link oriented segments into polylines of edge ids; closed loops repeat their first id"""
+    m = len(edges)
+    if m == 0:
+        return [], []
+
+    starts = np.full(int(edges.max()) + 1, -1, dtype=np.intp)
+    starts[edges[:, 0]] = np.arange(m)
+    following = starts[edges[:, 1]]
+    has_previous = np.zeros(m, dtype=bool)
+    has_previous[following[following >= 0]] = True
+
+    following = following.tolist()
+    first, last = edges[:, 0].tolist(), edges[:, 1].tolist()
+    visited = [False] * m
+    lines, closed = [], []
+
+    # Open chains start at the grid border, everything left over is a loop
+    heads = np.nonzero(~has_previous)[0].tolist()
+    for head in heads + list(range(m)):
+        if visited[head]:
+            continue
+        ids = [first[head]]
+        i = head
+        while i != -1 and not visited[i]:
+            visited[i] = True
+            ids.append(last[i])
+            i = following[i]
+        lines.append(ids)
+        closed.append(i != -1)
+    return lines, closed
+
+
+def chain_points(field, threshold, xs, ys, edges, locate=edge_points):
+    """Chain segment edge ids of one threshold and locate them, as polylines returns them"""
+    lines, closed = chain(edges)
+    if not lines:
+        return [], []
+    points = locate(field, threshold, xs, ys, np.concatenate(lines))
+    splits = np.cumsum([len(line) for line in lines])[:-1]
+    return np.split(points, splits), closed
+
+
+def polylines(field, threshold, xs, ys, locate=edge_points):
+    """Chained contours as a list of (P, 2) point arrays and a matching list of closed flags"""
+    return chain_points(field, threshold, xs, ys, segment_edges(field, threshold), locate)
+
+
+def level_codes(field, thresholds):
+    """Case codes of every cell for every threshold, as an (L, rows - 1, cols - 1) array"""
+    thresholds = np.asarray(thresholds, dtype=np.float64)[:, None, None]
+    inside = field >= thresholds
+    code = (inside[:, :-1, :-1] * 1 | inside[:, :-1, 1:] * 2 | inside[:, 1:, 1:] * 4 | inside[:, 1:, :-1] * 8).astype(np.intp)
+    centre = (field[:-1, :-1] + field[:-1, 1:] + field[1:, 1:] + field[1:, :-1]) / 4
+    code += 16 * (((code == 5) | (code == 10)) & (centre >= thresholds))
+    return code
+
+
+def level_segment_edges(field, thresholds):
+    """Edge id pairs of every level, as a list with one (M, 2) array per threshold"""
+    edges, index = code_segments(level_codes(field, thresholds), field.shape)
+    order = np.argsort(index[0], kind="stable")
+    splits = np.cumsum(np.bincount(index[0], minlength=len(thresholds)))[:-1]
+    return np.split(edges[order], splits)
+
+
+def multi_segments(field, thresholds, xs, ys, locate=edge_points):
+    """Contour segments of several thresholds from a single field, one (M, 2, 2) array per threshold"""
+    per_level = level_segment_edges(field, thresholds)
+    ids = np.concatenate([edges.ravel() for edges in per_level])
+    levels = np.repeat(np.asarray(thresholds, dtype=np.float64), [edges.size for edges in per_level])
+    points = locate(field, levels, xs, ys, ids).reshape(-1, 2, 2)
+    return np.split(points, np.cumsum([len(edges) for edges in per_level])[:-1])
+
+
+def multi_polylines(field, thresholds, xs, ys, locate=edge_points):
+    """Chained contours of several thresholds, one (lines, closed) pair per threshold"""
+    per_level = level_segment_edges(field, thresholds)
+    return [chain_points(field, threshold, xs, ys, edges, locate) for threshold, edges in zip(thresholds, per_level)]
+
+
+def _saddle_band(corners, corner_x, corner_y, low, high):
+    """Band polygons of one cell that is a saddle for low or high, as a list of (P, 2) arrays
+
+    Walks the cell boundary clockwise through corners and crossings. Leaving the band
+    at a crossing continues at the crossing its contour segment ends in, where saddles
+    of a level pair their four crossings so the segments cut off the corners on the
+    other side of the centre value, as case_codes does.
+    """
+    centre = corners.mean()
+    points, levels, after, pair_of = [], [], [], {}
+    for k in range(4):
+        a, b = corners[k], corners[(k + 1) % 4]
+        x0, y0 = corner_x[k], corner_y[k]
+        x1, y1 = corner_x[(k + 1) % 4], corner_y[(k + 1) % 4]
+        status = low <= a < high
+        points.append((x0, y0))
+        levels.append(None)
+        after.append(status)
+        crossings = sorted(((level - a) / (b - a), level) for level in (low, high) if (a >= level) != (b >= level))
+        for t, level in crossings:
+            status = not status
+            points.append((x0 + (x1 - x0) * t, y0 + (y1 - y0) * t))
+            levels.append(level)
+            after.append(status)
+
+    for level in (low, high):
+        ids = [i for i, value in enumerate(levels) if value == level]
+        if len(ids) == 4:
+            # Crossing k lies on edge k, the boundary between crossings k and k + 1 holds corner k + 1
+            first = 0 if (corners[1] >= level) != (centre >= level) else 1
+            pairs = ((ids[first], ids[first + 1]), (ids[first + 2], ids[(first + 3) % 4]))
+        else:
+            pairs = (tuple(ids),) if ids else ()
+        for a, b in pairs:
+            pair_of[a], pair_of[b] = b, a
+
+    polygons, visited = [], set()
+    for start in pair_of:
+        if not after[start] or start in visited:
+            continue
+        polygon, i = [], start
+        while True:
+            polygon.append(points[i])
+            visited.add(i)
+            if levels[i] is not None and not after[i]:
+                i = pair_of[i]
+                if i == start:
+                    break
+            else:
+                i = (i + 1) % len(points)
+        polygons.append(np.array(polygon))
+    return polygons
+
+
+def isobands(field, thresholds, xs, ys):
+    """Filled regions between consecutive thresholds, cut per cell
+
+    Returns one (points, counts) pair per band: the polygon vertices concatenated
+    in a (P, 2) array and the number of vertices of each polygon. Cells that are a
+    saddle for either level are split by their centre value like case_codes, and
+    may give two polygons.
+    """
+    x0, y0 = np.meshgrid(xs[:-1], ys[:-1])
+    x1, y1 = np.meshgrid(xs[1:], ys[1:])
+    # Corners and edges walked clockwise on screen: corner k starts edge k
+    corners = np.stack((field[:-1, :-1], field[:-1, 1:], field[1:, 1:], field[1:, :-1]), axis=-1)
+    corner_x = np.stack((x0, x1, x1, x0), axis=-1)
+    corner_y = np.stack((y0, y0, y1, y1), axis=-1)
+    delta = np.roll(corners, -1, axis=-1) - corners
+    delta_x = np.roll(corner_x, -1, axis=-1) - corner_x
+    delta_y = np.roll(corner_y, -1, axis=-1) - corner_y
+
+    result = []
+    for low, high in zip(thresholds[:-1], thresholds[1:]):
+        inside_low, inside_high = corners >= low, corners >= high
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_low, t_high = (low - corners) / delta, (high - corners) / delta
+        cross_low = inside_low != np.roll(inside_low, -1, axis=-1)
+        cross_high = inside_high != np.roll(inside_high, -1, axis=-1)
+
+        # Every edge contributes its start corner and up to two crossings, in order along the edge
+        swap = cross_low & cross_high & (t_high < t_low)
+        t = np.stack((np.zeros_like(t_low), np.where(swap, t_high, t_low), np.where(swap, t_low, t_high)), axis=-1)
+        valid = np.stack((inside_low & ~inside_high, np.where(swap, cross_high, cross_low), np.where(swap, cross_low, cross_high)), axis=-1)
+        # Edges without a crossing can be flat, their t is inf or nan and never used
+        t = np.where(valid, t, 0)
+
+        valid = valid.reshape(*valid.shape[:2], 12)
+        saddle = np.zeros(valid.shape[:2], dtype=bool)
+        for inside in (inside_low, inside_high):
+            saddle |= (inside[..., 0] == inside[..., 2]) & (inside[..., 1] == inside[..., 3]) & (inside[..., 0] != inside[..., 1])
+        active = (valid.sum(axis=-1) >= 3) & ~saddle
+        valid = valid[active]
+        t = t[active].reshape(-1, 12)
+        px = (corner_x[active][..., None] + delta_x[active][..., None] * t[..., None].reshape(-1, 4, 3)).reshape(-1, 12)
+        py = (corner_y[active][..., None] + delta_y[active][..., None] * t[..., None].reshape(-1, 4, 3)).reshape(-1, 12)
+        points, counts = [np.column_stack((px[valid], py[valid]))], [valid.sum(axis=1)]
+
+        # Saddles are rare, their polygons are traced one cell at a time
+        for row, col in zip(*np.nonzero(saddle)):
+            polygons = _saddle_band(corners[row, col], corner_x[row, col], corner_y[row, col], low, high)
+            points += polygons
+            counts.append(np.array([len(polygon) for polygon in polygons], dtype=np.intp))
+        result.append((np.concatenate(points), np.concatenate(counts)))
+    return result
@@ -0,0 +1,312 @@
+import shutil
+import struct
+import tempfile
+import time
+import numpy as np
+
+import v3
+from field import EPSILON
+
+
+# Volume variables
+DEPTH = 720
+VOXEL_SIZE = 10
+THRESHOLD = 2
+# Number of voxel layers evaluated at once, memory use is about SLAB_LAYERS * rows * cols * 8 bytes per temporary
+SLAB_LAYERS = 16
+
+# Cube corners and edges, numbered as in Paul Bourke's tables
+CORNERS = np.array([
+    (0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+    (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1),
+])
+EDGES = np.array([
+    (0, 1), (1, 2), (3, 2), (0, 3),
+    (4, 5), (5, 6), (7, 6), (4, 7),
+    (0, 4), (1, 5), (2, 6), (3, 7),
+])
+# Axis of every edge and the offset of its first corner
+EDGE_AXIS = np.argmax(CORNERS[EDGES[:, 1]] - CORNERS[EDGES[:, 0]], axis=1)
+EDGE_ORIGIN = CORNERS[EDGES[:, 0]]
+
+
+def _faces():
+    """Corner cycles of the six cube faces, counter clockwise seen from outside"""
+    faces = []
+    for axis in range(3):
+        for side in (0, 1):
+            corners = [i for i in range(8) if CORNERS[i, axis] == side]
+            normal = np.zeros(3)
+            normal[axis] = 1 if side else -1
+            centre = CORNERS[corners].mean(axis=0)
+            u = np.roll(normal, 1)
+            v = np.cross(normal, u)
+            angles = [np.arctan2(np.dot(CORNERS[i] - centre, v), np.dot(CORNERS[i] - centre, u)) for i in corners]
+            faces.append([corners[i] for i in np.argsort(angles)])
+    return faces
+
+
+def _build_tables():
+    """Triangle table of the 256 cases, with face saddles resolved by keeping inside corners apart"""
+    edge_of = {frozenset(pair): i for i, pair in enumerate(EDGES.tolist())}
+    faces = _faces()
+    triangles = np.full((256, 16), -1, dtype=np.intp)
+
+    for case in range(256):
+        inside = [(case >> i) & 1 for i in range(8)]
+        following = {}
+        for face in faces:
+            # Every run of inside corners on a face is cut off by one segment,
+            # walked from the edge where the run ends to the edge where it starts
+            for k in range(4):
+                a, b = face[k], face[(k + 1) % 4]
+                if inside[a] and not inside[b]:
+                    end = edge_of[frozenset((a, b))]
+                    j = k
+                    while inside[face[j]]:
+                        j = (j - 1) % 4
+                    start = edge_of[frozenset((face[j], face[(j + 1) % 4]))]
+                    following[end] = start
+
+        n = 0
+        while following:
+            loop = [next(iter(following))]
+            while following[loop[-1]] != loop[0]:
+                loop.append(following.pop(loop[-1]))
+            following.pop(loop[-1])
+            for i in range(1, len(loop) - 1):
+                triangles[case, n:n + 3] = loop[0], loop[i + 1], loop[i]
+                n += 3
+    return triangles
+
+
+TRIANGLES = _build_tables()
+TRIANGLE_COUNT = np.sum(TRIANGLES >= 0, axis=1) // 3
+
+
+class Spheres(v3.Spheres):
+    """Version 3 spheres with a z coordinate, rows are [x, y, z, radius]"""
+    def __init__(self, depth=DEPTH):
+        super().__init__()
+        self.depth = depth
+        n = len(self.spheres)
+        self.spheres = np.column_stack((self.spheres[:, :2], np.random.rand(n) * depth, self.spheres[:, 2]))
+        self.velocities = np.column_stack((self.velocities, np.random.rand(n) * v3.MAX_VEL))
+
+    def update(self, elapsed_time):
+        self.spheres[:, 0:3] += self.velocities * elapsed_time
+
+        bounds = np.array([v3.WIDTH, v3.HEIGHT, self.depth])
+        collision = ((self.spheres[:, 0:3] >= bounds) & (self.velocities > 0)) | ((self.spheres[:, 0:3] <= 0) & (self.velocities < 0))
+        self.velocities[collision] *= -1
+
+    def calc_val(self, x_vals, y_vals, z_vals):
+        dx = self.spheres[:, 0] - x_vals[:, None]
+        dy = self.spheres[:, 1] - y_vals[:, None]
+        dz = self.spheres[:, 2] - z_vals[:, None]
+        distances = np.sqrt(dx**2 + dy**2 + dz**2) + EPSILON
+
+        values = self.spheres[:, 3] / distances
+        return np.sum(values, axis=1)
+
+
+def evaluate_slab(spheres, xs, ys, zs):
+    """Field of every voxel in a slab, as a (layers, rows, cols) array accumulated one sphere at a time"""
+    values = np.zeros((len(zs), len(ys), len(xs)))
+    distances = np.empty_like(values)
+    for x, y, z, radius in spheres:
+        np.add(((zs - z) ** 2)[:, None, None], ((ys - y) ** 2)[None, :, None], out=distances)
+        distances += ((xs - x) ** 2)[None, None, :]
+        np.sqrt(distances, out=distances)
+        distances += EPSILON
+        np.divide(radius, distances, out=distances)
+        values += distances
+    return values
+
+
+def _edge_ids(layer, rows, cols, shape):
+    """Volume wide ids of the twelve edges of the given cubes"""
+    n_layers, n_rows, n_cols = shape
+    counts = [
+        n_layers * n_rows * (n_cols - 1),
+        n_layers * (n_rows - 1) * n_cols,
+    ]
+    sizes = [
+        (n_rows, n_cols - 1),
+        (n_rows - 1, n_cols),
+        (n_rows, n_cols),
+    ]
+    offsets = [0, counts[0], counts[0] + counts[1]]
+
+    ids = []
+    for axis, (dx, dy, dz) in zip(EDGE_AXIS, EDGE_ORIGIN):
+        height, width = sizes[axis]
+        ids.append(offsets[axis] + ((layer + dz) * height + rows + dy) * width + cols + dx)
+    return np.stack(ids, axis=-1)
+
+
+def slabs(spheres, xs, ys, zs, threshold=THRESHOLD, slab_layers=SLAB_LAYERS):
+    """Yield the mesh slab by slab as (new vertices, faces, triangle corners)
+
+    Vertices are numbered in the order they are yielded and shared between
+    neighbouring cubes, also across slab boundaries.
+    """
+    shape = (len(zs), len(ys), len(xs))
+    n_vertices = 0
+    previous_ids = np.empty(0, dtype=np.int64)
+    previous_index = np.empty(0, dtype=np.int64)
+
+    for start in range(0, len(zs) - 1, slab_layers):
+        stop = min(start + slab_layers + 1, len(zs))
+        values = evaluate_slab(spheres, xs, ys, zs[start:stop])
+        inside = values >= threshold
+
+        case = np.zeros((stop - start - 1, len(ys) - 1, len(xs) - 1), dtype=np.intp)
+        for i, (dx, dy, dz) in enumerate(CORNERS):
+            case |= inside[dz:dz + case.shape[0], dy:dy + case.shape[1], dx:dx + case.shape[2]] << i
+
+        layer, rows, cols = np.nonzero(TRIANGLE_COUNT[case])
+        if len(layer) == 0:
+            previous_ids = previous_ids[:0]
+            continue
+        case = case[layer, rows, cols]
+        edges = _edge_ids(layer + start, rows, cols, shape)
+
+        # Triangle corners as volume edge ids, then shared between cubes
+        local = TRIANGLES[case]
+        valid = local >= 0
+        corner_ids = np.take_along_axis(edges, np.where(valid, local, 0), axis=1)[valid]
+        ids, faces = np.unique(corner_ids, return_inverse=True)
+        faces = faces.reshape(-1, 3)
+
+        positions = _edge_points(ids, values, start, xs, ys, zs, shape, threshold)
+
+        # Edges on the first layer were already emitted by the previous slab
+        match = np.clip(np.searchsorted(previous_ids, ids), 0, max(len(previous_ids) - 1, 0))
+        known = (previous_ids[match] == ids) if len(previous_ids) else np.zeros(len(ids), dtype=bool)
+        index = np.empty(len(ids), dtype=np.int64)
+        index[known] = previous_index[match[known]]
+        index[~known] = n_vertices + np.arange(np.count_nonzero(~known))
+        n_vertices += np.count_nonzero(~known)
+
+        boundary = _edge_layer(ids, shape) == stop - 1
+        previous_ids, previous_index = ids[boundary], index[boundary]
+
+        yield positions[~known], index[faces], positions[faces]
+
+
+def _edge_layer(ids, shape):
+    """Layer of the first corner of every edge id"""
+    n_layers, n_rows, n_cols = shape
+    first = n_layers * n_rows * (n_cols - 1)
+    second = first + n_layers * (n_rows - 1) * n_cols
+    return np.select(
+        [ids < first, ids < second],
+        [ids // (n_rows * (n_cols - 1)), (ids - first) // ((n_rows - 1) * n_cols)],
+        (ids - second) // (n_rows * n_cols),
+    )
+
+
+def _edge_points(ids, values, start, xs, ys, zs, shape, threshold):
+    """Interpolated crossing point of every edge id, values holds the slab starting at layer start"""
+    n_layers, n_rows, n_cols = shape
+    first = n_layers * n_rows * (n_cols - 1)
+    second = first + n_layers * (n_rows - 1) * n_cols
+    axis = (ids >= first).astype(np.intp) + (ids >= second)
+    local = ids - np.array([0, first, second])[axis]
+    widths = np.array([n_cols - 1, n_cols, n_cols])[axis]
+    heights = np.array([n_rows, n_rows - 1, n_rows])[axis]
+
+    layer, rest = np.divmod(local, heights * widths)
+    rows, cols = np.divmod(rest, widths)
+    layer2 = layer + (axis == 2)
+    rows2 = rows + (axis == 1)
+    cols2 = cols + (axis == 0)
+
+    f0 = values[layer - start, rows, cols]
+    f1 = values[layer2 - start, rows2, cols2]
+    t = (threshold - f0) / (f1 - f0)
+    return np.column_stack((
+        xs[cols] + (xs[cols2] - xs[cols]) * t,
+        ys[rows] + (ys[rows2] - ys[rows]) * t,
+        zs[layer] + (zs[layer2] - zs[layer]) * t,
+    ))
+
+
+class PlyWriter:
+    """Streams a binary little endian PLY, faces are spooled to a temporary file until close"""
+    COUNT_WIDTH = 12
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.faces = tempfile.TemporaryFile()
+        self.n_vertices = 0
+        self.n_faces = 0
+        self.file.write(self._header())
+
+    def _header(self):
+        return (
+            "ply\nformat binary_little_endian 1.0\n"
+            f"element vertex {self.n_vertices:0{self.COUNT_WIDTH}d}\n"
+            "property float x\nproperty float y\nproperty float z\n"
+            f"element face {self.n_faces:0{self.COUNT_WIDTH}d}\n"
+            "property list uchar int vertex_indices\nend_header\n"
+        ).encode()
+
+    def write(self, vertices, faces, triangles):
+        self.file.write(vertices.astype("<f4").tobytes())
+        record = np.empty(len(faces), dtype=[("n", "u1"), ("indices", "<i4", 3)])
+        record["n"] = 3
+        record["indices"] = faces
+        self.faces.write(record.tobytes())
+        self.n_vertices += len(vertices)
+        self.n_faces += len(faces)
+
+    def close(self):
+        self.faces.seek(0)
+        shutil.copyfileobj(self.faces, self.file)
+        self.faces.close()
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+
+
+class StlWriter:
+    """Streams a binary STL, the triangle count is patched in on close"""
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.n_faces = 0
+        self.file.write(b"Metaballs marching cubes".ljust(80, b" ") + struct.pack("<I", 0))
+
+    def write(self, vertices, faces, triangles):
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+
+        record = np.zeros(len(triangles), dtype=[("normal", "<f4", 3), ("corners", "<f4", (3, 3)), ("attribute", "<u2")])
+        record["normal"] = normals
+        record["corners"] = triangles
+        self.file.write(record.tobytes())
+        self.n_faces += len(triangles)
+
+    def close(self):
+        self.file.seek(80)
+        self.file.write(struct.pack("<I", self.n_faces))
+        self.file.close()
+
+
+def extract(spheres, writer, width=v3.WIDTH, height=v3.HEIGHT, depth=DEPTH, size=VOXEL_SIZE, threshold=THRESHOLD, slab_layers=SLAB_LAYERS):
+    """Stream the isosurface of the spheres over the whole volume into a mesh writer"""
+    xs = np.arange(0, width + size, size, dtype=np.float64)
+    ys = np.arange(0, height + size, size, dtype=np.float64)
+    zs = np.arange(0, depth + size, size, dtype=np.float64)
+    for vertices, faces, triangles in slabs(spheres, xs, ys, zs, threshold, slab_layers):
+        writer.write(vertices, faces, triangles)
+    writer.close()
+
+
+if __name__ == "__main__":
+    spheres = Spheres()
+    start_time = time.time()
+    extract(spheres.spheres, PlyWriter("metaballs.ply"))
+    print(f"Mesh written to metaballs.ply in {time.time() - start_time:.2f}s")
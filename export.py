@@ -0,0 +1,132 @@
+import json
+import struct
+import numpy as np
+
+
+# Binary polyline format
+# data file:  header (magic, version, scale) then one record per frame:
+#             uint32 line count, uint32 point count, uint32 points per line, int16 (x, y) pairs
+# index file: int64 (offset, size) of every frame record in the data file
+MAGIC = b"MBPL"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+FRAME = struct.Struct("<II")
+DEFAULT_SCALE = 8
+INT16 = np.iinfo(np.int16)
+
+
+def fit_scale(extent, scale=DEFAULT_SCALE):
+    """Largest power of two up to scale keeping coordinates 0..extent inside int16, at least 1"""
+    while scale > 1 and extent * scale > INT16.max:
+        scale //= 2
+    return scale
+
+
+class SvgExporter:
+    """Streams every frame as an SVG group of paths"""
+    def __init__(self, path, width, height, color="#00ff00", stroke_width=3):
+        self.file = open(path, "w")
+        self.frame = 0
+        self.file.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n'
+            f'<g fill="none" stroke="{color}" stroke-width="{stroke_width}">\n'
+        )
+
+    def write(self, lines, closed):
+        paths = []
+        for line, is_closed in zip(lines, closed):
+            if is_closed:
+                line = line[:-1]
+            coords = " L".join(f"{x:.2f} {y:.2f}" for x, y in line)
+            paths.append(f'<path d="M{coords}{" Z" if is_closed else ""}"/>')
+        self.file.write(f'<g id="frame-{self.frame}">\n' + "\n".join(paths) + "\n</g>\n")
+        self.frame += 1
+
+    def close(self):
+        self.file.write("</g>\n</svg>\n")
+        self.file.close()
+
+
+class GeoJsonExporter:
+    """Streams a FeatureCollection with one LineString feature per contour"""
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.frame = 0
+        self.first = True
+        self.file.write('{"type": "FeatureCollection", "features": [\n')
+
+    def write(self, lines, closed):
+        for line, is_closed in zip(lines, closed):
+            feature = {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": np.round(line, 2).tolist()},
+                "properties": {"frame": self.frame, "closed": is_closed},
+            }
+            self.file.write(("" if self.first else ",\n") + json.dumps(feature))
+            self.first = False
+        self.frame += 1
+
+    def close(self):
+        self.file.write("\n]}\n")
+        self.file.close()
+
+
+class BinaryExporter:
+    """Appends frames as int16 fixed point polylines with an offset index for random access
+
+    Coordinates are stored times scale, so they must lie within -32768 / scale and
+    32767 / scale; fit_scale picks a scale for a known extent.
+    """
+    def __init__(self, path, scale=DEFAULT_SCALE):
+        self.scale = scale
+        self.file = open(path, "wb")
+        self.index = open(path + ".idx", "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, scale))
+        self.offset = HEADER.size
+
+    def write(self, lines, closed=None):
+        counts = np.array([len(line) for line in lines], dtype=np.uint32)
+        if lines:
+            points = np.round(np.concatenate(lines) * self.scale)
+            if points.min() < INT16.min or points.max() > INT16.max:
+                low, high = INT16.min / self.scale, INT16.max / self.scale
+                raise ValueError(f"coordinates outside {low:g}..{high:g} do not fit int16 at scale {self.scale}")
+            points = points.astype("<i2")
+        else:
+            points = np.empty((0, 2), dtype="<i2")
+
+        record = FRAME.pack(len(counts), len(points)) + counts.astype("<u4").tobytes() + points.tobytes()
+        self.file.write(record)
+        self.index.write(np.array([self.offset, len(record)], dtype="<i8").tobytes())
+        self.offset += len(record)
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+
+class BinaryReader:
+    """Memory maps a binary polyline file and decodes single frames on demand"""
+    def __init__(self, path):
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, self.scale = HEADER.unpack(self.data[:HEADER.size].tobytes())
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a binary polyline file")
+        self.index = np.fromfile(path + ".idx", dtype="<i8").reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, frame):
+        offset, size = self.index[frame]
+        n_lines, n_points = FRAME.unpack(self.data[offset:offset + FRAME.size].tobytes())
+        start = offset + FRAME.size
+        counts = self.data[start:start + 4 * n_lines].view("<u4")
+        start += 4 * n_lines
+        points = self.data[start:start + 4 * n_points].view("<i2").reshape(-1, 2) / self.scale
+        return np.split(points, np.cumsum(counts)[:-1]) if n_lines else []
+
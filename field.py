@@ -0,0 +1,94 @@
+import numpy as np
+
+
+# Offset added to every distance so a vertex on a sphere centre stays finite
+EPSILON = 0.0001
+
+
+def grid(width, height, size, x0=0, y0=0):
+    """Column and row coordinates of the vertex grid covering the given area"""
+    xs = np.arange(x0, x0 + width + size, size, dtype=np.float64)
+    ys = np.arange(y0, y0 + height + size, size, dtype=np.float64)
+    return xs, ys
+
+
+def evaluate(spheres, xs, ys):
+    """Field value r / d summed over all spheres, returned as a (rows, cols) array"""
+    dx = spheres[:, 0] - xs[None, :, None]
+    dy = spheres[:, 1] - ys[:, None, None]
+    distances = np.sqrt(dx**2 + dy**2) + EPSILON
+
+    values = spheres[:, 2] / distances
+    return np.sum(values, axis=2)
+
+
+def evaluate_points(spheres, points):
+    """Field value at arbitrary (P, 2) points"""
+    dx = spheres[:, 0] - points[:, 0, None]
+    dy = spheres[:, 1] - points[:, 1, None]
+    distances = np.sqrt(dx**2 + dy**2) + EPSILON
+    return np.sum(spheres[:, 2] / distances, axis=1)
+
+
+def gradient_points(spheres, points):
+    """Field value and analytic gradient at arbitrary (P, 2) points"""
+    dx = points[:, 0, None] - spheres[:, 0]
+    dy = points[:, 1, None] - spheres[:, 1]
+    raw = np.sqrt(dx**2 + dy**2)
+    distances = raw + EPSILON
+    values = spheres[:, 2] / distances
+    # d/dx r / (d + eps) = -r / (d + eps)^2 * dx / d
+    scale = -values / distances / np.maximum(raw, EPSILON)
+    return np.sum(values, axis=1), np.column_stack((np.sum(scale * dx, axis=1), np.sum(scale * dy, axis=1)))
+
+
+def interpolate(values, xs, ys, points):
+    """Bilinear interpolation of a grid field at arbitrary (P, 2) points, clamped to the grid"""
+    size = np.array([xs[1] - xs[0], ys[1] - ys[0]])
+    position = np.clip((points - [xs[0], ys[0]]) / size, 0, [len(xs) - 1, len(ys) - 1])
+    cell = np.minimum(position.astype(np.intp), [len(xs) - 2, len(ys) - 2])
+    u, v = (position - cell).T
+    c, r = cell.T
+    top = values[r, c] * (1 - u) + values[r, c + 1] * u
+    bottom = values[r + 1, c] * (1 - u) + values[r + 1, c + 1] * u
+    return top * (1 - v) + bottom * v
+
+
+def evaluate_separable(spheres, xs, ys, out=None):
+    """Same field as evaluate, built from per sphere tables of dx**2 per column and dy**2 per row
+
+    Vertices lie on a regular grid, so dx only depends on the column and dy on the row.
+    Every sphere costs one broadcast add of its two tables and an in place kernel over a
+    single (rows, cols) buffer instead of a full (rows, cols, spheres) array. Results
+    match evaluate up to the order of the final summation.
+    """
+    dx2 = (xs - spheres[:, 0, None]) ** 2
+    dy2 = (ys - spheres[:, 1, None]) ** 2
+    values = np.empty((len(ys), len(xs))) if out is None else out
+    values.fill(0)
+    buffer = np.empty_like(values)
+    for row_table, column_table, radius in zip(dy2, dx2, spheres[:, 2]):
+        np.add(row_table[:, None], column_table, out=buffer)
+        np.sqrt(buffer, out=buffer)
+        buffer += EPSILON
+        np.divide(radius, buffer, out=buffer)
+        values += buffer
+    return values
+
+
+def evaluate_tiles(spheres, xs, ys):
+    """Field over many small grids at once, xs (T, cols) and ys (T, rows) holding every tile's coordinates
+
+    Uses the same per sphere dx**2 and dy**2 tables as evaluate_separable, with one in
+    place kernel per sphere over a (T, rows, cols) buffer, so scattered tiles cost about
+    as much per vertex as a full grid pass.
+    """
+    values = np.zeros((len(ys), ys.shape[1], xs.shape[1]))
+    buffer = np.empty_like(values)
+    for sx, sy, radius in spheres.tolist():
+        np.add(((ys - sy) ** 2)[:, :, None], ((xs - sx) ** 2)[:, None, :], out=buffer)
+        np.sqrt(buffer, out=buffer)
+        buffer += EPSILON
+        np.divide(radius, buffer, out=buffer)
+        values += buffer
+    return values
@@ -0,0 +1,115 @@
+import sys
+import time
+import numpy as np
+
+import v3
+import field
+import contour
+
+
+# Headless run variables
+FRAMES = 1000
+FRAME_TIME = 1 / 60
+SQUARE_SIZE = 10
+THRESHOLD = 2
+
+# One record per contour, little endian so files can be appended and memory mapped anywhere.
+# Area and centroid are NaN for open contours cut by the grid border.
+DTYPE = np.dtype([
+    ("frame", "<i8"),
+    ("contour", "<i4"),
+    ("closed", "?"),
+    ("area", "<f8"),
+    ("perimeter", "<f8"),
+    ("centroid_x", "<f8"),
+    ("centroid_y", "<f8"),
+    ("x_min", "<f8"),
+    ("y_min", "<f8"),
+    ("x_max", "<f8"),
+    ("y_max", "<f8"),
+])
+
+
+def measure(lines, closed, frame=0):
+    """Signed area, perimeter, centroid and bounding box of every contour, as a DTYPE array
+
+    All contours are handled at once: per segment terms are computed on the concatenated
+    points and summed per contour with reduceat. The area is positive for blobs, whose
+    inside lies on the right of the contour, and negative for holes.
+    """
+    records = np.zeros(len(lines), dtype=DTYPE)
+    if not lines:
+        return records
+    points = np.concatenate(lines)
+    counts = np.array([len(line) for line in lines])
+    starts = np.cumsum(counts) - counts
+
+    # Segments between consecutive points of the same contour; the last point of every contour starts none
+    x0, y0, x1, y1 = points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1]
+    same = np.ones(len(points) - 1, dtype=bool)
+    same[(starts + counts - 1)[:-1]] = False
+    cross = np.where(same, x0 * y1 - x1 * y0, 0)
+    length = np.where(same, np.hypot(x1 - x0, y1 - y0), 0)
+    # Segment i starts at point i, so the segments of every contour also begin at its first point
+    area = np.add.reduceat(cross, starts) / 2
+    cx = np.add.reduceat((x0 + x1) * cross, starts)
+    cy = np.add.reduceat((y0 + y1) * cross, starts)
+
+    closed = np.asarray(closed, dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        records["area"] = np.where(closed, area, np.nan)
+        records["centroid_x"] = np.where(closed, cx / (6 * area), np.nan)
+        records["centroid_y"] = np.where(closed, cy / (6 * area), np.nan)
+    records["frame"] = frame
+    records["contour"] = np.arange(len(lines))
+    records["closed"] = closed
+    records["perimeter"] = np.add.reduceat(length, starts)
+    records["x_min"], records["y_min"] = np.minimum.reduceat(points, starts).T
+    records["x_max"], records["y_max"] = np.maximum.reduceat(points, starts).T
+    return records
+
+
+class MetricsWriter:
+    """Appends the records of every frame to a raw DTYPE file"""
+    def __init__(self, path, append=False):
+        self.file = open(path, "ab" if append else "wb")
+        self.frame = 0
+
+    def write(self, lines, closed):
+        records = measure(lines, closed, self.frame)
+        records.tofile(self.file)
+        self.frame += 1
+        return records
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def load(path):
+    """All records of a metrics file, memory mapped"""
+    return np.memmap(path, dtype=DTYPE, mode="r")
+
+
+if __name__ == "__main__":
+    # Headless run: python metrics.py [output]
+    path = sys.argv[1] if len(sys.argv) > 1 else "metrics.bin"
+    spheres = v3.Spheres()
+    xs, ys = field.grid(v3.WIDTH, v3.HEIGHT, SQUARE_SIZE)
+    writer = MetricsWriter(path)
+
+    contour_time = metrics_time = 0
+    for _ in range(FRAMES):
+        spheres.update(FRAME_TIME)
+        start_time = time.time()
+        lines, closed = contour.polylines(field.evaluate_separable(spheres.spheres, xs, ys), THRESHOLD, xs, ys)
+        contour_time += time.time() - start_time
+
+        start_time = time.time()
+        writer.write(lines, closed)
+        metrics_time += time.time() - start_time
+    writer.close()
+
+    print(f"{FRAMES} frames, field and contours {contour_time * 1000 / FRAMES:.2f}ms, metrics {metrics_time * 1000 / FRAMES:.2f}ms per frame")
@@ -0,0 +1,131 @@
+import numpy as np
+
+import field
+
+
+# Side of the vertex tiles the band is made of, cells added around the displacement margin,
+# relative distance to a threshold below which a tile is always re-evaluated, and frames
+# between full passes
+TILE = 4
+MARGIN = 1
+NEAR = 0.05
+FULL_EVERY = 60
+# Neighbouring tiles as (row, col) offsets with the vertices of a tile facing each of them
+SIDES = (
+    ((-1, 0), np.s_[:, 0, :]), ((1, 0), np.s_[:, -1, :]), ((0, -1), np.s_[:, :, 0]), ((0, 1), np.s_[:, :, -1]),
+    ((-1, -1), np.s_[:, 0, 0]), ((-1, 1), np.s_[:, 0, -1]), ((1, -1), np.s_[:, -1, 0]), ((1, 1), np.s_[:, -1, -1]),
+)
+
+
+def dilate(rows, cols, radius, shape):
+    """Boolean mask of the (rows, cols) positions grown by radius in every direction (a square structuring element)"""
+    offsets = np.arange(-radius, radius + 1)
+    mask = np.zeros(shape, dtype=bool)
+    mask[
+        np.clip(rows[:, None, None] + offsets[:, None], 0, shape[0] - 1),
+        np.clip(cols[:, None, None] + offsets[None, :], 0, shape[1] - 1),
+    ] = True
+    return mask
+
+
+class NarrowBand:
+    """Keeps the field of the previous frame and only re-evaluates the tiles around its contour
+
+    Spheres move a bounded distance per frame, so the new isoline stays within the tiles
+    holding crossed cells in the last frame, dilated by that distance. The grid's vertices
+    are split into tile x tile tiles and the band is kept as a list of tiles, so outside
+    full passes every step is sized by the band: dilating the active tile list, a
+    (tiles, tile, tile) kernel per sphere from per tile dx**2 and dy**2 tables, and the
+    crossing and near threshold tests of the tiles just evaluated. Vertices outside the
+    band keep their old values, which still classify correctly, and tiles with a value
+    close to a threshold stay in the band. A full pass is made every full_every frames,
+    when the thresholds or sphere count change, when the contour reaches the band's edge,
+    or when the vertex nearest to a sphere centre changes side, which catches new blobs.
+    Holes opening far from the old contour can still be missed until the next full pass.
+    """
+    def __init__(self, xs, ys, margin=MARGIN, near=NEAR, full_every=FULL_EVERY, tile=TILE):
+        self.xs, self.ys = xs, ys
+        self.size = max(xs[1] - xs[0], ys[1] - ys[0])
+        self.margin = margin
+        self.near = near
+        self.full_every = full_every
+        self.tile = tile
+        # Vertex rows and columns of every tile plus the next tile's first one, clamped to the grid
+        self.rows = np.minimum(np.arange(0, len(ys), tile)[:, None] + np.arange(tile + 1), len(ys) - 1)
+        self.cols = np.minimum(np.arange(0, len(xs), tile)[:, None] + np.arange(tile + 1), len(xs) - 1)
+        self.shape = (len(self.rows), len(self.cols))
+        self.values = None
+        self.active = None
+        self.state = None
+        self.thresholds = None
+        self.frame = 0
+        self.evaluated = 0
+        self.full_passes = 0
+
+    def full(self, spheres):
+        self.values = field.evaluate_separable(spheres, self.xs, self.ys)
+        self.evaluated += self.values.size
+        self.full_passes += 1
+        self.active = np.zeros(self.shape, dtype=bool)
+        self.flag(*np.nonzero(np.ones(self.shape, dtype=bool)))
+
+    def flag(self, rows, cols):
+        """Mark the given tiles active when a cell starting in them is crossed or a vertex is near a threshold"""
+        block = self.values[self.rows[rows][:, :, None], self.cols[cols][:, None, :]]
+        level = np.searchsorted(self.thresholds, block, "right")
+        crossed = level.min(axis=(1, 2)) != level.max(axis=(1, 2))
+        # Flat regions close to a threshold are where the isoline can jump, when blobs merge or split
+        near = np.any(np.abs(block[..., None] - self.thresholds) < self.near * self.thresholds, axis=(1, 2, 3))
+        self.active[rows, cols] = crossed | near
+
+    def band(self, spheres):
+        """Re-evaluate the dilated band, False when the result cannot be trusted"""
+        shift = np.max(np.hypot(*(spheres[:, :2] - self.state[:, :2]).T), initial=0)
+        reach = int(np.ceil(shift / self.size)) + self.margin
+        inside = dilate(*np.nonzero(self.active), -(-reach // self.tile), self.shape)
+        rows, cols = np.nonzero(inside)
+
+        vertex_rows, vertex_cols = self.rows[rows, :-1, None], self.cols[cols, None, :-1]
+        old = np.searchsorted(self.thresholds, self.values[vertex_rows, vertex_cols], "right")
+        values = field.evaluate_tiles(spheres, self.xs[self.cols[cols, :-1]], self.ys[self.rows[rows, :-1]])
+        self.values[vertex_rows, vertex_cols] = values
+        self.evaluated += values.size
+
+        # Vertices facing a tile outside the band must keep their side, otherwise the contour left the band
+        changed = np.searchsorted(self.thresholds, values, "right") != old
+        padded = np.pad(inside, 1, constant_values=True)
+        for (d_row, d_col), facing in SIDES:
+            outside = ~padded[rows + 1 + d_row, cols + 1 + d_col]
+            if np.any(changed[facing][outside]):
+                return False
+
+        # Tiles reading the new values: the band and the tiles above and left of it, whose last row or column it holds
+        touched = dilate(rows, cols, 1, self.shape)
+        self.flag(*np.nonzero(touched))
+
+        # A blob away from every old contour contains a sphere centre whose nearest vertex changed side
+        rows = np.clip(np.rint((spheres[:, 1] - self.ys[0]) / (self.ys[1] - self.ys[0])).astype(np.intp), 0, len(self.ys) - 1)
+        cols = np.clip(np.rint((spheres[:, 0] - self.xs[0]) / (self.xs[1] - self.xs[0])).astype(np.intp), 0, len(self.xs) - 1)
+        outside = ~inside[rows // self.tile, cols // self.tile]
+        exact = field.evaluate_points(spheres, np.column_stack((self.xs[cols[outside]], self.ys[rows[outside]])))
+        self.evaluated += len(exact)
+        stored = self.values[rows[outside], cols[outside]]
+        return np.array_equal(np.searchsorted(self.thresholds, exact, "right"), np.searchsorted(self.thresholds, stored, "right"))
+
+    def update(self, spheres, thresholds):
+        """Field for the current spheres, returned with the number of vertices evaluated"""
+        thresholds = np.sort(np.atleast_1d(thresholds))
+        restart = (
+            self.values is None
+            or self.frame % self.full_every == 0
+            or len(spheres) != len(self.state)
+            or not np.array_equal(thresholds, self.thresholds)
+        )
+        self.thresholds = thresholds
+        self.evaluated = 0
+        if restart or not self.band(spheres):
+            self.full(spheres)
+
+        self.state = spheres.copy()
+        self.frame += 1
+        return self.values, self.evaluated
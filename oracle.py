@@ -0,0 +1,246 @@
+import sys
+import time
+import numpy as np
+from unittest import mock
+
+import field
+import contour
+import refine
+import v3
+
+
+# Validation variables
+FRAMES = 1000
+FRAME_TIME = 1 / 165
+REFERENCE_SIZE = 2
+BISECTION_STEPS = 30
+# Points compared at once in the brute force distance passes
+CHUNK = 512
+
+
+def record(path, frames=FRAMES, elapsed_time=FRAME_TIME):
+    """Simulate Version 3 spheres and save every frame's state as a (frames, N, 3) array"""
+    spheres = v3.Spheres()
+    states = np.empty((frames,) + spheres.spheres.shape)
+    for i in range(frames):
+        spheres.update(elapsed_time)
+        states[i] = spheres.spheres
+    np.save(path, states)
+    return states
+
+
+def vectorized_engine(size, threshold, refine_steps=0, subdivisions=0):
+    """Engine built on field.py and contour.py, optionally refined with refine.py"""
+    xs, ys = field.grid(v3.WIDTH, v3.HEIGHT, size)
+
+    def engine(spheres):
+        locate = refine.locator(spheres, refine_steps) if refine_steps else contour.edge_points
+        segments = contour.segments(field.evaluate_separable(spheres, xs, ys), threshold, xs, ys, locate)
+        for _ in range(subdivisions):
+            segments = refine.subdivide(spheres, segments, threshold, max(refine_steps, 1))
+        return segments
+    return engine
+
+
+def v3_engine():
+    """Version 3 Squares, with its pg.draw.line calls captured as segments"""
+    squares = v3.Squares()
+    spheres = v3.Spheres()
+
+    def engine(state):
+        spheres.spheres = state
+        lines = []
+        squares.update(spheres)
+        with mock.patch.object(v3.pg.draw, "line", lambda surface, color, start, end, width: lines.append((tuple(start), tuple(end)))):
+            squares.draw(None)
+        return np.array(lines, dtype=np.float64).reshape(-1, 2, 2)
+    return engine
+
+
+def reference(spheres, threshold, size=REFERENCE_SIZE, steps=BISECTION_STEPS):
+    """Contour on a fine float64 grid with every crossing bisected onto the exact isoline
+
+    Returns the crossing points and the component of every point.
+    """
+    xs, ys = field.grid(v3.WIDTH, v3.HEIGHT, size)
+    values = field.evaluate_separable(spheres, xs, ys)
+    lines, _ = contour.chain(contour.segment_edges(values, threshold))
+    if not lines:
+        return np.empty((0, 2)), np.empty(0, dtype=np.intp)
+
+    ids = np.concatenate(lines)
+    labels = np.repeat(np.arange(len(lines)), [len(line) for line in lines])
+    rows, cols, rows2, cols2 = contour.edge_vertices(values.shape, ids)
+    start = np.column_stack((xs[cols], ys[rows]))
+    step = np.column_stack((xs[cols2], ys[rows2])) - start
+
+    low, high = start, start + step
+    low_inside = field.evaluate_points(spheres, low) >= threshold
+    for _ in range(steps):
+        middle = (low + high) / 2
+        same = (field.evaluate_points(spheres, middle) >= threshold) == low_inside
+        low = np.where(same[:, None], middle, low)
+        high = np.where(same[:, None], high, middle)
+    return (low + high) / 2, labels
+
+
+def _point_segment_distance(points, segments):
+    """Distance of every point to the nearest segment, brute force in chunks"""
+    if len(segments) == 0:
+        return np.full(len(points), np.inf)
+    # x and y kept apart, reductions over a trailing axis of two are slow
+    sx, sy = segments[:, 0, 0], segments[:, 0, 1]
+    dx, dy = segments[:, 1, 0] - sx, segments[:, 1, 1] - sy
+    length = np.maximum(dx**2 + dy**2, 1e-12)
+    distances = np.empty(len(points))
+    for i in range(0, len(points), CHUNK):
+        ox = points[i:i + CHUNK, 0, None] - sx
+        oy = points[i:i + CHUNK, 1, None] - sy
+        t = np.clip((ox * dx + oy * dy) / length, 0, 1)
+        ox -= t * dx
+        oy -= t * dy
+        distances[i:i + CHUNK] = np.sqrt(np.min(ox**2 + oy**2, axis=1))
+    return distances
+
+
+def _components(segments):
+    """Connected components of segments sharing endpoints"""
+    if len(segments) == 0:
+        return np.empty(0, dtype=np.intp)
+    _, ends = np.unique(np.round(segments.reshape(-1, 2), 6), axis=0, return_inverse=True)
+    parent = list(range(ends.max() + 1))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in ends.reshape(-1, 2).tolist():
+        parent[find(a)] = find(b)
+    _, labels = np.unique([find(a) for a in ends[::2].tolist()], return_inverse=True)
+    return labels
+
+
+def saddle_cells(spheres, threshold, size):
+    """Saddle cells of the engine grid and the kind of segments the exact field gives each"""
+    xs, ys = field.grid(v3.WIDTH, v3.HEIGHT, size)
+    values = field.evaluate_separable(spheres, xs, ys)
+    case = contour.cases(values, threshold)
+    rows, cols = np.nonzero((case == 5) | (case == 10))
+    centres = np.column_stack((xs[cols] + size / 2, ys[rows] + size / 2))
+    connected = field.evaluate_points(spheres, centres) >= threshold
+    # Kind 1 segments cut off the top-left or bottom-right corner, kind 0 the other two
+    return rows, cols, ((case[rows, cols] == 5) != connected).astype(np.intp)
+
+
+def _saddles(segments, size, cells):
+    """Number of saddle cells and how many the engine resolved differently than the exact field"""
+    rows, cols, expected = cells
+    if len(rows) == 0:
+        return 0, 0
+
+    xs, ys = field.grid(v3.WIDTH, v3.HEIGHT, size)
+    cell = np.floor((segments.mean(axis=1) - [xs[0], ys[0]]) / size).astype(np.intp)
+    owner = {key: i for i, key in enumerate(zip(rows.tolist(), cols.tolist()))}
+    pairing = np.full(len(rows), -1)
+    for (col, row), (start, end) in zip(cell.tolist(), segments.tolist()):
+        i = owner.get((row, col))
+        if i is None:
+            continue
+        # Top or bottom edge point together with a left or right edge point: which corner is cut off
+        top = min(start[1], end[1]) - ys[row] < 1e-6
+        left = min(start[0], end[0]) - xs[col] < 1e-6
+        kind = int(top == left)
+        pairing[i] = kind if pairing[i] in (-1, kind) else -2
+    return len(rows), int(np.count_nonzero(pairing != expected))
+
+
+def expectation(spheres, threshold, size):
+    """What compare checks an engine against for one sphere state, independent of the engine
+
+    The reference contour and the saddle cells of the engine grid, so engines sharing a
+    grid size can be validated against one set computed per state.
+    """
+    points, labels = reference(spheres, threshold)
+    return points, labels, saddle_cells(spheres, threshold, size)
+
+
+def compare(spheres, segments, threshold, size, expected=None):
+    """Compare an engine's segments for one sphere state against the reference contour
+
+    expected is the state's expectation, computed here when not given.
+    """
+    if expected is None:
+        expected = expectation(spheres, threshold, size)
+    points, labels, cells = expected
+    samples = np.concatenate((segments[:, 0], segments[:, 1], segments.mean(axis=1))) if len(segments) else np.empty((0, 2))
+
+    # Engine to reference: first order distance |f - T| / |grad f| using the exact field
+    values, gradient = field.gradient_points(spheres, samples)
+    extra_distance = np.abs(values - threshold) / np.maximum(np.hypot(gradient[:, 0], gradient[:, 1]), 1e-12)
+    missed_distance = _point_segment_distance(points, segments)
+
+    matched = np.zeros(labels.max() + 1 if len(labels) else 0, dtype=bool)
+    matched[labels[missed_distance <= size]] = True
+
+    # A component is extra when none of its segments comes near the isoline
+    components = _components(segments)
+    closest = np.full(components.max() + 1 if len(components) else 0, np.inf)
+    np.minimum.at(closest, components, extra_distance.reshape(3, -1).max(axis=0))
+
+    saddles, saddle_errors = _saddles(segments, size, cells)
+    return {
+        "hausdorff": float(max(extra_distance.max(initial=0), missed_distance.max(initial=0))),
+        "missed_components": int(np.count_nonzero(~matched)),
+        "extra_components": int(np.count_nonzero(closest > size)),
+        "saddles": saddles,
+        "saddle_disagreements": saddle_errors,
+    }
+
+
+def validate(engine, states, threshold, size, expected=None):
+    """Run an engine over recorded sphere states and compare every frame
+
+    expected holds the expectation of every state, pass it to share them between engines.
+    """
+    if expected is None:
+        expected = [expectation(state, threshold, size) for state in states]
+    return [compare(state, engine(state), threshold, size, expect) for state, expect in zip(states, expected)]
+
+
+def summary(reports):
+    return {
+        "frames": len(reports),
+        "max_hausdorff": max(report["hausdorff"] for report in reports),
+        "mean_hausdorff": float(np.mean([report["hausdorff"] for report in reports])),
+        "missed_components": sum(report["missed_components"] for report in reports),
+        "extra_components": sum(report["extra_components"] for report in reports),
+        "saddles": sum(report["saddles"] for report in reports),
+        "saddle_disagreements": sum(report["saddle_disagreements"] for report in reports),
+    }
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "states.npy"
+    try:
+        states = np.load(path)
+    except FileNotFoundError:
+        states = record(path)
+
+    size = v3.SQUARE_SIZE
+    start_time = time.time()
+    expected = [expectation(state, v3.THRESHOLD, size) for state in states]
+    print(f"reference: {len(states)} states in {time.time() - start_time:.2f}s")
+
+    failed = False
+    for name, engine in (
+        ("vectorized", vectorized_engine(size, v3.THRESHOLD)),
+        ("refined", vectorized_engine(size, v3.THRESHOLD, 2, 2)),
+        ("v3", v3_engine()),
+    ):
+        start_time = time.time()
+        result = summary(validate(engine, states, v3.THRESHOLD, size, expected))
+        print(f"{name}: {result} in {time.time() - start_time:.2f}s")
+        failed |= result["max_hausdorff"] > size or result["missed_components"] > 0 or result["extra_components"] > 0
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,70 @@
+import os
+import numpy as np
+
+import contour
+from export import BinaryExporter, fit_scale
+
+
+# Number of cell rows processed at once, memory use is about BAND_ROWS * width * 8 bytes per temporary
+BAND_ROWS = 512
+
+
+def open_raster(path, shape=None, dtype=np.float32):
+    """Memory map a .npy file, or a raw array when its shape is given"""
+    if shape is None:
+        return np.load(path, mmap_mode="r")
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def bands(raster, band_rows=BAND_ROWS):
+    """Yield (first row, band) pairs, each band sharing its last row with the next one"""
+    height = raster.shape[0]
+    for start in range(0, height - 1, band_rows):
+        stop = min(start + band_rows + 1, height)
+        yield start, np.asarray(raster[start:stop], dtype=np.float64)
+
+
+def band_segments(raster, threshold, band_rows=BAND_ROWS):
+    """Yield the contour segments of every band in raster pixel coordinates"""
+    xs = np.arange(raster.shape[1], dtype=np.float64)
+    for start, band in bands(raster, band_rows):
+        ys = np.arange(start, start + len(band), dtype=np.float64)
+        yield contour.segments(band, threshold, xs, ys)
+
+
+def band_polylines(raster, threshold, band_rows=BAND_ROWS):
+    """Yield the chained contours of every band, contours crossing a band seam are split there"""
+    xs = np.arange(raster.shape[1], dtype=np.float64)
+    for start, band in bands(raster, band_rows):
+        ys = np.arange(start, start + len(band), dtype=np.float64)
+        yield contour.polylines(band, threshold, xs, ys)
+
+
+def extract_segments(raster, threshold, path, band_rows=BAND_ROWS):
+    """Append all segments as raw float32 (M, 2, 2) records to path and return their count"""
+    total = 0
+    with open(path, "wb") as file:
+        for segments in band_segments(raster, threshold, band_rows):
+            file.write(segments.astype(np.float32).tobytes())
+            total += len(segments)
+    return total
+
+
+def load_segments(path):
+    """Memory map a file written by extract_segments"""
+    if os.path.getsize(path) == 0:
+        return np.empty((0, 2, 2), dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="r").reshape(-1, 2, 2)
+
+
+def extract_polylines(raster, threshold, exporter, band_rows=BAND_ROWS):
+    """Write every band's polylines as one record of an exporter from export.py"""
+    for lines, closed in band_polylines(raster, threshold, band_rows):
+        exporter.write(lines, closed)
+    exporter.close()
+
+
+def extract_binary(raster, threshold, path, band_rows=BAND_ROWS):
+    """extract_polylines into a BinaryExporter whose scale fits the raster's pixel coordinates"""
+    exporter = BinaryExporter(path, fit_scale(max(raster.shape) - 1))
+    extract_polylines(raster, threshold, exporter, band_rows)
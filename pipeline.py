@@ -0,0 +1,109 @@
+import sys
+import time
+from functools import cached_property
+import pygame as pg
+
+import v3
+import field
+import contour
+from metrics import MetricsWriter
+
+
+# Headless run variables
+FRAMES = 1000
+FRAME_TIME = 1 / 60
+SQUARE_SIZE = 10
+THRESHOLD = 2
+
+
+class Frame:
+    """One simulation step whose stages are computed on first access and kept
+
+    The spheres are copied when the frame is made, so a frame read late still shows
+    its own step. Every stage only pulls the ones it needs: segments never chain,
+    and nothing runs for a frame that is only counted.
+    """
+    def __init__(self, index, spheres, xs, ys, threshold=THRESHOLD):
+        self.index = index
+        self.spheres = spheres.copy()
+        self.xs, self.ys = xs, ys
+        self.threshold = threshold
+
+    @cached_property
+    def field(self):
+        return field.evaluate_separable(self.spheres, self.xs, self.ys)
+
+    @cached_property
+    def cases(self):
+        return contour.cases(self.field, self.threshold)
+
+    @cached_property
+    def codes(self):
+        return contour.case_codes(self.field, self.threshold, self.cases)
+
+    @cached_property
+    def edges(self):
+        return contour.segment_edges(self.field, self.threshold, self.codes)
+
+    @cached_property
+    def segments(self):
+        return contour.edge_points(self.field, self.threshold, self.xs, self.ys, self.edges.ravel()).reshape(-1, 2, 2)
+
+    @cached_property
+    def polylines(self):
+        """Chained contours and their closed flags, as contour.polylines returns them"""
+        return contour.chain_points(self.field, self.threshold, self.xs, self.ys, self.edges)
+
+
+def frames(spheres, n=None, elapsed_time=FRAME_TIME, threshold=THRESHOLD, size=SQUARE_SIZE):
+    """Yield n lazy frames, or frames forever, stepping the spheres before each one
+
+    The spheres only move when the next frame is pulled, so a slow consumer holds the
+    simulation back instead of letting frames pile up.
+    """
+    xs, ys = field.grid(v3.WIDTH, v3.HEIGHT, size)
+    index = 0
+    while n is None or index < n:
+        spheres.update(elapsed_time)
+        yield Frame(index, spheres.spheres, xs, ys, threshold)
+        index += 1
+
+
+def write(stream, writer):
+    """Pass frames on after writing their polylines, to an exporter from export.py or a MetricsWriter"""
+    for frame in stream:
+        writer.write(*frame.polylines)
+        yield frame
+
+
+def render(stream, surface, color=v3.GREEN, width=3):
+    """Pass frames on after drawing their segments onto the surface"""
+    for frame in stream:
+        for start, end in frame.segments:
+            pg.draw.line(surface, color, start, end, width)
+        yield frame
+
+
+def drain(stream):
+    """Pull every frame through the stages and return how many there were"""
+    count = 0
+    for count, _ in enumerate(stream, 1):
+        pass
+    return count
+
+
+if __name__ == "__main__":
+    # Headless run: python pipeline.py [metrics output], segments only, then polylines into metrics
+    path = sys.argv[1] if len(sys.argv) > 1 else "metrics.bin"
+
+    start_time = time.time()
+    total = sum(len(frame.segments) for frame in frames(v3.Spheres(), FRAMES))
+    segments_time = time.time() - start_time
+
+    writer = MetricsWriter(path)
+    start_time = time.time()
+    drain(write(frames(v3.Spheres(), FRAMES), writer))
+    metrics_time = time.time() - start_time
+    writer.close()
+
+    print(f"{FRAMES} frames, segments only {segments_time * 1000 / FRAMES:.2f}ms ({total} segments), polylines and metrics {metrics_time * 1000 / FRAMES:.2f}ms per frame")
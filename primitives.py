@@ -0,0 +1,109 @@
+import numpy as np
+
+from field import EPSILON
+
+
+# Row layout of every primitive type, the field of a row is weight / (distance to its core + EPSILON)
+#   circle:  x, y, radius                    core is the centre, weight the radius
+#   capsule: x0, y0, x1, y1, radius          core is the segment, weight the radius
+#   ellipse: x, y, a, b, angle               distance is scaled by the semi axes, weight 1
+#   box:     x, y, half_w, half_h, angle, radius   core is the rotated rectangle, weight the radius
+COLUMNS = {"circle": 3, "capsule": 5, "ellipse": 5, "box": 6}
+
+# Offset in pixels of the central differences taken for gradients
+GRADIENT_STEP = 1e-3
+
+
+def circle_field(rows, px, py):
+    distance = np.sqrt((px - rows[:, 0]) ** 2 + (py - rows[:, 1]) ** 2)
+    return rows[:, 2] / (distance + EPSILON)
+
+
+def capsule_field(rows, px, py):
+    ax, ay = rows[:, 0], rows[:, 1]
+    bx, by = rows[:, 2] - ax, rows[:, 3] - ay
+    length2 = np.maximum(bx**2 + by**2, EPSILON)
+    t = np.clip(((px - ax) * bx + (py - ay) * by) / length2, 0, 1)
+    distance = np.sqrt((px - ax - t * bx) ** 2 + (py - ay - t * by) ** 2)
+    return rows[:, 4] / (distance + EPSILON)
+
+
+def _local(rows, px, py, angle):
+    """Coordinates in the frame of each primitive, centred and rotated by -angle"""
+    cos, sin = np.cos(angle), np.sin(angle)
+    dx, dy = px - rows[:, 0], py - rows[:, 1]
+    return dx * cos + dy * sin, dy * cos - dx * sin
+
+
+def ellipse_field(rows, px, py):
+    # With a == b == r this is the circle field up to EPSILON,
+    # the isoline at threshold t has semi axes a / t and b / t
+    u, v = _local(rows, px, py, rows[:, 4])
+    return 1 / (np.sqrt((u / rows[:, 2]) ** 2 + (v / rows[:, 3]) ** 2) + EPSILON)
+
+
+def box_field(rows, px, py):
+    u, v = _local(rows, px, py, rows[:, 4])
+    outside_u = np.maximum(np.abs(u) - rows[:, 2], 0)
+    outside_v = np.maximum(np.abs(v) - rows[:, 3], 0)
+    return rows[:, 5] / (np.sqrt(outside_u**2 + outside_v**2) + EPSILON)
+
+
+FIELDS = {"circle": circle_field, "capsule": capsule_field, "ellipse": ellipse_field, "box": box_field}
+
+
+class Primitives:
+    """Field sources grouped by type, one contiguous (N, columns) array per type"""
+    def __init__(self):
+        self.rows = {kind: np.empty((0, columns)) for kind, columns in COLUMNS.items()}
+
+    @classmethod
+    def from_spheres(cls, spheres):
+        primitives = cls()
+        primitives.rows["circle"] = np.array(spheres, dtype=np.float64).reshape(-1, 3)
+        return primitives
+
+    def add(self, kind, *columns):
+        """Append one primitive per entry of the columns, given as scalars or equal length arrays"""
+        rows = np.column_stack([np.ravel(column) for column in np.broadcast_arrays(*columns)]).astype(np.float64)
+        self.rows[kind] = np.vstack((self.rows[kind], rows))
+
+    def add_circle(self, x, y, radius):
+        self.add("circle", x, y, radius)
+
+    def add_capsule(self, x0, y0, x1, y1, radius):
+        self.add("capsule", x0, y0, x1, y1, radius)
+
+    def add_ellipse(self, x, y, a, b, angle=0.0):
+        self.add("ellipse", x, y, a, b, angle)
+
+    def add_box(self, x, y, half_width, half_height, angle=0.0, radius=1.0):
+        self.add("box", x, y, half_width, half_height, angle, radius)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.rows.values())
+
+    def evaluate(self, xs, ys):
+        """Field of all primitives on the vertex grid, one batched pass per type"""
+        values = np.zeros((len(ys), len(xs)))
+        px, py = xs[None, :, None], ys[:, None, None]
+        for kind, rows in self.rows.items():
+            if len(rows):
+                values += np.sum(FIELDS[kind](rows, px, py), axis=2)
+        return values
+
+    def evaluate_points(self, points):
+        """Field of all primitives at arbitrary (P, 2) points"""
+        values = np.zeros(len(points))
+        px, py = points[:, 0, None], points[:, 1, None]
+        for kind, rows in self.rows.items():
+            if len(rows):
+                values += np.sum(FIELDS[kind](rows, px, py), axis=1)
+        return values
+
+    def gradient_points(self, points, step=GRADIENT_STEP):
+        """Field value and central difference gradient at arbitrary (P, 2) points"""
+        offsets = np.array([[0, 0], [step, 0], [-step, 0], [0, step], [0, -step]])
+        values = self.evaluate_points((points[None, :, :] + offsets[:, None, :]).reshape(-1, 2)).reshape(5, -1)
+        gradient = np.column_stack((values[1] - values[2], values[3] - values[4])) / (2 * step)
+        return values[0], gradient
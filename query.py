@@ -0,0 +1,131 @@
+import numpy as np
+
+import field
+
+
+# Side of the index bins in pixels, a few grid cells so every bin holds a handful of segments
+BIN_SIZE = 32
+
+
+class ContourQuery:
+    """Hit tests against one frame's field and contour segments
+
+    Inside tests interpolate the field grid bilinearly. Distances come from a uniform
+    bin index over the (M, 2, 2) segments, stored as one array of segment ids sorted by
+    bin with an offset per bin, searched in growing square rings of bins.
+    """
+    def __init__(self, values, threshold, xs, ys, segments, bin_size=BIN_SIZE):
+        self.field, self.threshold = values, threshold
+        self.xs, self.ys = xs, ys
+        self.segments = segments
+        self.start = segments[:, 0]
+        self.direction = segments[:, 1] - segments[:, 0]
+        self.inverse_length = 1 / np.maximum(np.sum(self.direction**2, axis=1), 1e-12)
+        self.bin_size = bin_size
+        self.origin = np.array([xs[0], ys[0]])
+        self.bins = np.array([
+            int(np.ceil((xs[-1] - xs[0]) / bin_size)) + 1,
+            int(np.ceil((ys[-1] - ys[0]) / bin_size)) + 1,
+        ])
+
+        # Every segment goes into all bins its bounding box touches, segments span one grid cell
+        low = self.bin_of(segments.min(axis=1))
+        high = self.bin_of(segments.max(axis=1))
+        span = high - low + 1
+        counts = span[:, 0] * span[:, 1]
+        owner = np.repeat(np.arange(len(segments)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        bx = low[owner, 0] + local % span[owner, 0]
+        by = low[owner, 1] + local // span[owner, 0]
+        keys = by * self.bins[0] + bx
+        order = np.argsort(keys, kind="stable")
+        self.ids = owner[order]
+        self.offsets = np.searchsorted(keys[order], np.arange(self.bins.prod() + 1))
+
+        # Rings of bins from every bin to the closest one holding a segment
+        occupied = np.flatnonzero(np.diff(self.offsets))
+        by, bx = np.divmod(np.arange(self.bins.prod()), self.bins[0])
+        reach = np.zeros(self.bins.prod(), dtype=np.intp)
+        if len(occupied):
+            for i in range(0, len(reach), 256):
+                gap = np.maximum(np.abs(bx[i:i + 256, None] - bx[occupied]), np.abs(by[i:i + 256, None] - by[occupied]))
+                reach[i:i + 256] = gap.min(axis=1)
+        self.reach = reach.reshape(self.bins[1], self.bins[0])
+
+    def bin_of(self, points):
+        return np.clip(((points - self.origin) // self.bin_size).astype(np.intp), 0, self.bins - 1)
+
+    def values(self, points):
+        """Field at arbitrary (P, 2) points, interpolated bilinearly from the grid"""
+        return field.interpolate(self.field, self.xs, self.ys, points)
+
+    def inside(self, points):
+        return self.values(points) >= self.threshold
+
+    def candidates(self, points, index, ring):
+        """(point, segment) pairs for the points' square rings of bins, as index positions and segment ids"""
+        offsets = np.arange(-ring, ring + 1)
+        home = self.bin_of(points[index])
+        bx = (home[:, 0, None, None] + offsets[None, None, :]).repeat(len(offsets), axis=1)
+        by = (home[:, 1, None, None] + offsets[None, :, None]).repeat(len(offsets), axis=2)
+        valid = (bx >= 0) & (bx < self.bins[0]) & (by >= 0) & (by < self.bins[1])
+        owner = np.broadcast_to(np.arange(len(index))[:, None, None], bx.shape)[valid]
+        keys = by[valid] * self.bins[0] + bx[valid]
+
+        counts = self.offsets[keys + 1] - self.offsets[keys]
+        owner = np.repeat(owner, counts)
+        position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(self.offsets[keys], counts)
+        return owner, self.ids[position]
+
+    def nearest(self, points, index, ring):
+        """Distance to the nearest segment in the given square ring of bins around each point"""
+        owner, segment = self.candidates(points, index, ring)
+        direction = self.direction[segment]
+        offset = points[index[owner]] - self.start[segment]
+        t = np.clip(np.einsum("ij,ij->i", offset, direction) * self.inverse_length[segment], 0, 1)
+        offset -= t[:, None] * direction
+        distance = np.einsum("ij,ij->i", offset, offset)
+
+        # Pairs come grouped by point, so the minimum of every group is one reduceat
+        nearest = np.full(len(index), np.inf)
+        starts = np.searchsorted(owner, np.arange(len(index)))
+        found = starts < np.append(starts[1:], len(owner))
+        if len(owner):
+            nearest[found] = np.sqrt(np.minimum.reduceat(distance, starts[found]))
+        return nearest
+
+    def distance(self, points, limit=None):
+        """Distance from every point to the nearest contour segment, inf without segments
+
+        The first search reaches one ring past the closest occupied bin, which finds some
+        segment. A segment closer than that one lies within ceil(distance / bin_size) rings,
+        so a second search over those rings settles the points the first could not. With
+        a limit, points farther than it from every segment are skipped and get inf, which
+        keeps far points as cheap as near ones.
+        """
+        result = np.full(len(points), np.inf)
+        if len(self.segments) == 0:
+            return result
+        home = self.bin_of(points)
+        ring = self.reach[home[:, 1], home[:, 0]] + 1
+        pending = np.arange(len(points))
+        if limit is not None:
+            # Points whose closest occupied bin is already beyond the limit cannot get under it
+            far = (ring - 2) * self.bin_size > limit
+            pending = pending[~far]
+            ring = np.minimum(ring, int(np.ceil(limit / self.bin_size)) + 1)
+        for _ in range(2):
+            for size in np.unique(ring[pending]):
+                index = pending[ring[pending] == size]
+                result[index] = self.nearest(points, index, size)
+            # Points may lie outside the grid, by up to their distance to its border
+            slack = np.max(np.maximum(np.maximum(self.origin - points[pending], points[pending] - self.origin - self.bins * self.bin_size), 0), axis=1)
+            unsure = result[pending] > ring[pending] * self.bin_size - slack
+            pending = pending[unsure]
+            reach = result[pending] + slack[unsure]
+            if limit is not None:
+                reach = np.minimum(reach, limit + slack[unsure])
+            ring[pending] = np.ceil(reach / self.bin_size).astype(np.intp) + 1
+        if limit is not None:
+            result[result > limit] = np.inf
+        return result
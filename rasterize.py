@@ -0,0 +1,159 @@
+import numpy as np
+import pygame as pg
+
+
+# Rasterizer variables
+LINE_WIDTH = 3
+ANTIALIAS = True
+
+
+def segment_samples(segments):
+    """One sample per pixel column (or row, for steep segments) along every segment
+
+    Returns the major axis pixel, the minor axis coordinate at its centre, whether the
+    segment is steep, and the width factor 1 / cos(angle) of each sample.
+    """
+    start, end = segments[:, 0], segments[:, 1]
+    delta = end - start
+    steep = np.abs(delta[:, 1]) > np.abs(delta[:, 0])
+    major = np.where(steep, 1, 0)
+    index = np.arange(len(segments))
+
+    a0, a1 = start[index, major], end[index, major]
+    b0, b1 = start[index, 1 - major], end[index, 1 - major]
+    first = np.floor(np.minimum(a0, a1)).astype(np.int64)
+    count = np.floor(np.maximum(a0, a1)).astype(np.int64) - first + 1
+
+    owner = np.repeat(index, count)
+    pixel = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count) + first[owner]
+    span = a1 - a0
+    slope = np.divide(b1 - b0, span, out=np.zeros_like(span), where=span != 0)
+    centre = np.clip(pixel + 0.5, np.minimum(a0, a1)[owner], np.maximum(a0, a1)[owner])
+    minor = b0[owner] + (centre - a0[owner]) * slope[owner]
+    return pixel, minor, steep[owner], np.sqrt(1 + slope[owner] ** 2)
+
+
+class Rasterizer:
+    """Draws whole segment arrays as sparse pixel coverage and blends only the covered pixels
+
+    Samples are kept as packed integers, the pixel's y * width + x times 256 plus its
+    coverage in 1/255 steps, so overlapping samples reduce to their largest coverage
+    with one sort. Pixels are blended through a flat view of the surface's 32 bit
+    pixels, either straight into the target surface or into a persistent frame surface
+    which, over a plain colour background, only has last frame's pixels restored.
+    """
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.frame = pg.Surface((width, height))
+        self.samples = []
+        # Background colour of the frame and the pixels blended over it since it was filled
+        self.background = None
+        self.touched = np.empty(0, dtype=np.int64)
+
+    def clear(self):
+        self.samples = []
+
+    def draw(self, segments, line_width=LINE_WIDTH, antialias=ANTIALIAS):
+        """Add the segments' coverage, Xiaolin Wu style when antialiased, DDA otherwise"""
+        if len(segments) == 0:
+            return
+        pixel, minor, steep, stretch = segment_samples(np.asarray(segments, dtype=np.float64))
+
+        # Every sample covers a run of pixels across the minor axis, wide enough for the line width
+        minor = minor.astype(np.float32)
+        half = (line_width * stretch / 2).astype(np.float32)
+        if antialias:
+            taps = int(np.ceil(line_width * stretch.max())) + 1
+            across = np.floor(minor - half)[:, None] + np.arange(taps, dtype=np.float32)
+            coverage = np.minimum(across + 1, (minor + half)[:, None]) - np.maximum(across, (minor - half)[:, None])
+        else:
+            taps = max(1, int(round(line_width)))
+            across = np.floor(minor)[:, None] - (taps - 1) // 2 + np.arange(taps, dtype=np.float32)
+            coverage = np.ones(across.shape, dtype=np.float32)
+        level = (np.minimum(coverage, 1) * 255 + 0.5).astype(np.int64)
+
+        # Steep samples step along y and spread across x, the others the other way round.
+        # Packed keys are built with the steps already shifted past the coverage byte.
+        across = across.astype(np.int64)
+        across_step = np.where(steep, 1 << 8, self.width << 8)
+        along_step = np.where(steep, self.width << 8, 1 << 8)
+        limit = np.where(steep, self.width, self.height)
+        valid = (pixel >= 0) & (pixel < np.where(steep, self.height, self.width))
+        packed = across * across_step[:, None] + (pixel * along_step)[:, None] + level
+        # Negative positions wrap to large unsigned values, so one comparison checks both ends
+        inside = (across.view(np.uint64) < limit[:, None]) & (level > 0) & valid[:, None]
+        self.samples.append(packed[inside])
+
+    def coverage(self):
+        """Flat (y * width + x) index and coverage 1..255 of every covered pixel, the largest where samples overlap"""
+        if not self.samples:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        packed = np.sort(np.concatenate(self.samples))
+        # Coverage sorts below the pixel index, so the last sample of every pixel is its largest
+        last = np.append(packed[1:] >> 8 != packed[:-1] >> 8, True)
+        packed = packed[last]
+        return packed >> 8, packed & 255
+
+    def blend(self, surface, color):
+        """Blend the line colour into the covered pixels of a 32 bit surface, returns their flat index"""
+        index, level = self.coverage()
+        pixels = pg.surfarray.pixels2d(surface).T
+        # Rows padded past the width have no flat view, their pixels are indexed by row and column
+        flat = pixels.reshape(-1) if pixels.flags.c_contiguous else None
+        position = index if flat is not None else np.divmod(index, self.width)
+        under = flat[index] if flat is not None else pixels[position]
+
+        # Two byte lanes 16 bits apart blend with one multiply each: a lane times a weight
+        # up to 256 stays below the next lane. Bits outside the colour masks are kept.
+        weight = (level + (level >> 7)).astype(np.uint32)
+        rest = np.uint32(256) - weight
+        mapped = np.uint32(surface.map_rgb(color))
+        low, high = np.uint32(0x00FF00FF), np.uint32(8)
+        even = ((under & low) * rest + (mapped & low) * weight) >> high
+        odd = ((under >> high) & low) * rest + ((mapped >> high) & low) * weight
+        rgb = np.uint32(sum(surface.get_masks()[:3]))
+        blended = (((even & low) | (odd & ~low)) & rgb) | (under & ~rgb)
+        if flat is not None:
+            flat[index] = blended
+        else:
+            pixels[position] = blended
+        # The surface stays locked while a pixel view exists
+        del pixels, flat
+        return index
+
+    def compose(self, color, background):
+        """The persistent frame surface with the line colour blended over the background"""
+        if isinstance(background, np.ndarray):
+            pg.surfarray.blit_array(self.frame, background)
+            self.background = None
+        elif self.background != tuple(background):
+            self.frame.fill(background)
+            self.background = tuple(background)
+        elif len(self.touched):
+            pixels = pg.surfarray.pixels2d(self.frame).T
+            restore = self.frame.map_rgb(background)
+            if pixels.flags.c_contiguous:
+                pixels.reshape(-1)[self.touched] = restore
+            else:
+                pixels[np.divmod(self.touched, self.width)] = restore
+            del pixels
+        self.touched = self.blend(self.frame, color)
+        return self.frame
+
+    def blit(self, surface, color, background=(0, 0, 0)):
+        """Draw the lines onto a 32 bit surface
+
+        background is a colour or a (width, height, 3) array to compose over in the
+        frame surface, or None to blend into the surface's own pixels in place.
+        """
+        if background is None:
+            self.blend(surface, color)
+        else:
+            surface.blit(self.compose(color, background), (0, 0))
+
+
+def polyline_segments(lines):
+    """(M, 2, 2) segments between consecutive points of every polyline"""
+    if not lines:
+        return np.empty((0, 2, 2))
+    return np.concatenate([np.stack((line[:-1], line[1:]), axis=1) for line in lines])
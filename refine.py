@@ -0,0 +1,106 @@
+import numpy as np
+
+import field
+import contour
+
+
+# Refinement variables
+STEPS = 2
+NEWTON = True
+
+
+def evaluate_points(spheres, points, static=None):
+    """Field of the spheres, plus static primitives when given, at arbitrary (P, 2) points"""
+    value = field.evaluate_points(spheres, points)
+    return value if static is None else value + static.evaluate_points(points)
+
+
+def gradient_points(spheres, points, static=None):
+    """Field value and gradient of the spheres, plus static primitives when given"""
+    value, gradient = field.gradient_points(spheres, points)
+    if static is not None:
+        static_value, static_gradient = static.gradient_points(points)
+        value, gradient = value + static_value, gradient + static_gradient
+    return value, gradient
+
+
+def edge_points(spheres, values, threshold, xs, ys, ids, steps=STEPS, newton=NEWTON, static=None):
+    """Crossing points moved onto the exact isoline with a few root finding steps along their edge
+
+    Starts from the linear interpolation of the grid values and keeps a bracket on the
+    edge, so a Newton step that leaves it falls back to a false position step. The
+    static primitives.Primitives, if any, are part of the field like in the grid values.
+    """
+    rows, cols, rows2, cols2 = contour.edge_vertices(values.shape, ids)
+    start = np.column_stack((xs[cols], ys[rows]))
+    delta = np.column_stack((xs[cols2], ys[rows2])) - start
+
+    low, high = np.zeros(len(start)), np.ones(len(start))
+    f_low, f_high = values[rows, cols] - threshold, values[rows2, cols2] - threshold
+    low_inside = f_low >= 0
+    t = f_low / (f_low - f_high)
+
+    for _ in range(steps):
+        points = start + delta * t[:, None]
+        if newton:
+            value, gradient = gradient_points(spheres, points, static)
+            slope = np.sum(gradient * delta, axis=1)
+        else:
+            value = evaluate_points(spheres, points, static)
+        error = value - threshold
+
+        same = (error >= 0) == low_inside
+        low, f_low = np.where(same, t, low), np.where(same, error, f_low)
+        high, f_high = np.where(same, high, t), np.where(same, f_high, error)
+
+        secant = (low * f_high - high * f_low) / (f_high - f_low)
+        if newton:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                newton_t = t - error / slope
+            t = np.where((newton_t > low) & (newton_t < high), newton_t, secant)
+        else:
+            t = secant
+    return start + delta * t[:, None]
+
+
+def locator(spheres, steps=STEPS, newton=NEWTON, static=None):
+    """Refining replacement for contour.edge_points, to pass as locate to the contour builders"""
+    def locate(values, threshold, xs, ys, ids):
+        return edge_points(spheres, values, threshold, xs, ys, ids, steps, newton, static)
+    return locate
+
+
+def project(spheres, points, threshold, steps=STEPS, static=None):
+    """Move points onto the isoline with Newton steps along the field gradient"""
+    for _ in range(steps):
+        value, gradient = gradient_points(spheres, points, static)
+        norm = np.maximum(np.sum(gradient**2, axis=1), 1e-12)
+        points = points - ((value - threshold) / norm)[:, None] * gradient
+    return points
+
+
+def subdivide(spheres, segments, threshold, steps=STEPS, static=None):
+    """Split every (M, 2, 2) segment at its midpoint projected onto the isoline"""
+    middle = project(spheres, segments.mean(axis=1), threshold, steps, static)
+    return np.concatenate((
+        np.stack((segments[:, 0], middle), axis=1),
+        np.stack((middle, segments[:, 1]), axis=1),
+    ))
+
+
+def subdivide_lines(spheres, lines, threshold, steps=STEPS, static=None):
+    """Insert the projected midpoint between every pair of consecutive polyline points"""
+    if not lines:
+        return lines
+    points = np.concatenate(lines)
+    ends = np.cumsum([len(line) for line in lines])
+    pairs = np.ones(len(points) - 1, dtype=bool)
+    pairs[ends[:-1] - 1] = False
+    middle = project(spheres, ((points[:-1] + points[1:]) / 2)[pairs], threshold, steps, static)
+
+    result = []
+    for line, middles in zip(lines, np.split(middle, np.cumsum([len(line) - 1 for line in lines])[:-1])):
+        refined = np.empty((2 * len(line) - 1, 2))
+        refined[0::2], refined[1::2] = line, middles
+        result.append(refined)
+    return result
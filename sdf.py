@@ -0,0 +1,153 @@
+import numpy as np
+import pygame as pg
+
+import field
+
+
+# Screen pixels per distance field sample, and the distance in pixels the colour table spans each way
+SCALE = 4
+RANGE = 32
+# Squared distance standing in for infinity, large but finite so envelope intersections stay defined
+FAR = 1e20
+
+
+def transform_rows(f):
+    """Felzenszwalb-Huttenlocher squared distance transform along the last axis
+
+    Computes min over q of (p - q)**2 + f[q] for every row at once, and the q reaching
+    it: the lower envelope of the parabolas rooted at every sample is built column by
+    column for all rows together, then read back column by column.
+    """
+    rows, n = f.shape
+    every = np.arange(rows)
+    k = np.zeros(rows, dtype=np.intp)
+    v = np.zeros((rows, n), dtype=np.intp)
+    z = np.full((rows, n + 1), np.inf)
+    z[:, 0] = -np.inf
+    q2 = np.arange(n, dtype=np.float64) ** 2
+
+    for q in range(1, n):
+        active = every
+        while len(active):
+            r = v[active, k[active]]
+            s = ((f[active, q] + q2[q]) - (f[active, r] + q2[r])) / (2 * q - 2 * r)
+            # Parabolas hidden by the new one are dropped from the envelope
+            hidden = s <= z[active, k[active]]
+            k[active[hidden]] -= 1
+            settled = active[~hidden]
+            k[settled] += 1
+            v[settled, k[settled]] = q
+            z[settled, k[settled]] = s[~hidden]
+            z[settled, k[settled] + 1] = np.inf
+            active = active[hidden]
+
+    # Envelope segment of every column: z is sorted per row, offsetting each row by its
+    # index times the row span turns all rows into one sorted array for searchsorted
+    span = n + 2
+    bounds = np.clip(z[:, 1:], -1, n) + every[:, None] * span
+    valid = np.arange(n)[None, :] <= k[:, None]
+    bounds = np.where(valid, bounds, (every[:, None] + 1) * span - 1)
+    position = np.searchsorted(bounds.ravel(), (np.arange(n)[None, :] + every[:, None] * span).ravel(), "left")
+    segment = position.reshape(rows, n) - every[:, None] * n
+    r = np.take_along_axis(v, segment, axis=1)
+    return (np.arange(n) - r) ** 2 + np.take_along_axis(f, r, axis=1), r
+
+
+def window_rows(f, reach):
+    """Same minimum as transform_rows, looking only up to reach samples away along the last axis
+
+    Every offset is one shifted whole-array comparison, so the cost is linear in the
+    samples times the reach. Minimums coming from farther than reach are missed, which
+    leaves every true value up to reach**2 exact and the rest at least that large.
+    """
+    n = f.shape[1]
+    best = f.copy()
+    source = np.broadcast_to(np.arange(n), f.shape).copy()
+    for offset in range(1, min(reach, n - 1) + 1):
+        step = offset**2
+        for target, other, index in (
+            (np.s_[:, :-offset], np.s_[:, offset:], np.arange(offset, n)),
+            (np.s_[:, offset:], np.s_[:, :-offset], np.arange(n - offset)),
+        ):
+            candidate = f[other] + step
+            better = candidate < best[target]
+            np.copyto(best[target], candidate, where=better)
+            np.copyto(source[target], index, where=better)
+    return best, source
+
+
+def transform(f, reach=None):
+    """Exact squared Euclidean distance transform of a 2D cost array, one separable pass per axis
+
+    Also returns the row and column of the sample every minimum comes from. With a
+    reach in samples, both passes only look that far, which is exact for every
+    distance up to reach and much cheaper than the envelope for small reaches.
+    """
+    rows = transform_rows if reach is None else (lambda g: window_rows(g, reach))
+    across, column = rows(f)
+    down, row = rows(across.T)
+    row = row.T
+    return down.T, row, np.take_along_axis(column, row, axis=0)
+
+
+def signed_distance(values, threshold, xs, ys, segments, width, height, scale=SCALE, reach=RANGE):
+    """Signed distance in pixels to the isoline, negative inside, sampled every scale pixels
+
+    Seeded from the (M, 2, 2) contour segments: points along every segment, at least one
+    per sample, give the samples around them their closest point and its squared
+    distance, everything else starts far away. The transform finds the seed every
+    sample is closest to through its distance, and the distance is then measured to
+    that seed's contour point, which stays exact where the contour is straight. The
+    sign comes from the field interpolated at every sample. The transform itself only
+    depends on the number of samples, not on the segments. Distances are exact up to
+    reach pixels, which is all the colour table shows; samples farther away may come
+    out larger or infinite. A reach of None searches the whole grid.
+    """
+    columns, rows = int(np.ceil(width / scale)) + 1, int(np.ceil(height / scale)) + 1
+    seeds = np.full((rows, columns), FAR)
+    closest = np.full((rows, columns, 2), np.inf)
+    if len(segments):
+        longest = np.max(np.sqrt(np.sum((segments[:, 1] - segments[:, 0]) ** 2, axis=1)))
+        t = np.linspace(0, 1, int(np.ceil(longest / scale)) + 2)[:, None, None]
+        points = (segments[:, 0] * (1 - t) + segments[:, 1] * t).reshape(-1, 2)
+        position = points / scale
+        for dx in (0, 1):
+            for dy in (0, 1):
+                cell = np.floor(position).astype(np.intp) + [dx, dy]
+                keep = (cell[:, 0] >= 0) & (cell[:, 0] < columns) & (cell[:, 1] >= 0) & (cell[:, 1] < rows)
+                offset2 = np.sum((position[keep] - cell[keep]) ** 2, axis=1)
+                np.minimum.at(seeds, (cell[keep, 1], cell[keep, 0]), offset2)
+                # Any point reaching the minimum will do as the sample's closest one
+                best = offset2 == seeds[cell[keep, 1], cell[keep, 0]]
+                closest[cell[keep, 1][best], cell[keep, 0][best]] = position[keep][best]
+
+    _, row, column = transform(seeds, None if reach is None else int(np.ceil(reach / scale)) + 1)
+    gx, gy = np.meshgrid(np.arange(columns) * scale, np.arange(rows) * scale)
+    nearest = closest[row, column] * scale
+    distance = np.hypot(nearest[..., 0] - gx, nearest[..., 1] - gy)
+    inside = field.interpolate(values, xs, ys, np.column_stack((gx.ravel(), gy.ravel()))) >= threshold
+    return np.where(inside.reshape(rows, columns), -distance, distance)
+
+
+def glow_table(color, background=(0, 0, 0), outline=3, glow=RANGE):
+    """256 entry colour table over signed distances -RANGE..RANGE: solid outline, fading glow outside
+
+    The glow decays exponentially and is shifted and rescaled to reach exactly 0 at
+    glow pixels, so samples farther out, which all map to the last entry, keep the
+    background colour.
+    """
+    distance = np.linspace(-RANGE, RANGE, 256)
+    t = np.clip((distance - outline / 2) / (min(glow, RANGE) - outline / 2), 0, 1)
+    fade = (np.exp(-4 * t) - np.exp(-4)) / (1 - np.exp(-4))
+    weight = np.where(np.abs(distance) <= outline / 2, 1.0, fade * (distance > 0))
+    return np.rint(np.asarray(background) * (1 - weight[:, None]) + np.asarray(color) * weight[:, None]).astype(np.uint8)
+
+
+def blit(surface, distance, table, scale=SCALE):
+    """Map every sample's signed distance through the colour table and draw it scaled up smoothly"""
+    rows, columns = distance.shape
+    index = np.clip((distance + RANGE) * (255 / (2 * RANGE)), 0, 255).astype(np.uint8)
+    samples = pg.Surface((columns, rows))
+    pg.surfarray.blit_array(samples, table[index.T])
+    # Every sample covers a scale x scale square centred on its position
+    surface.blit(pg.transform.smoothscale(samples, (columns * scale, rows * scale)), (-(scale // 2), -(scale // 2)))
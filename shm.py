@@ -0,0 +1,120 @@
+import sys
+import time
+import numpy as np
+import pygame as pg
+from multiprocessing import shared_memory, resource_tracker
+
+
+# Shared memory layout
+# header: uint64 magic, slots, width, height, channels, latest sequence, then one sequence per slot
+# frames: slots x (height, width, channels) uint8, rows first so consumers get the usual image layout
+MAGIC = 0x4D424C4652494E47
+HEADER_FIELDS = 6
+SLOTS = 3
+CHANNELS = 3
+
+# Segments created by FrameRings of this process, whose tracker registration readers must keep
+_created = set()
+
+
+def _header_size(slots):
+    return 8 * (HEADER_FIELDS + slots)
+
+
+class FrameRing:
+    """Ring of frame buffers in shared memory, written by the renderer
+
+    A slot's sequence number is cleared while it is written, and the latest sequence
+    is published only after the frame is complete.
+    """
+    def __init__(self, name, width, height, slots=SLOTS, channels=CHANNELS):
+        frame_size = width * height * channels
+        self.memory = shared_memory.SharedMemory(name=name, create=True, size=_header_size(slots) + slots * frame_size)
+        self.header = np.ndarray(HEADER_FIELDS + slots, dtype=np.uint64, buffer=self.memory.buf)
+        self.header[:HEADER_FIELDS] = MAGIC, slots, width, height, channels, 0
+        self.header[HEADER_FIELDS:] = 0
+        self.frames = np.ndarray((slots, height, width, channels), dtype=np.uint8, buffer=self.memory.buf, offset=_header_size(slots))
+        self.slots = slots
+        self.sequence = 0
+        _created.add(self.memory._name)
+
+    def acquire(self):
+        """Slot to render the next frame into, as a (height, width, channels) view"""
+        slot = (self.sequence + 1) % self.slots
+        self.header[HEADER_FIELDS + slot] = 0
+        return self.frames[slot]
+
+    def publish(self):
+        """Mark the frame written into the acquired slot as the latest one"""
+        self.sequence += 1
+        self.header[HEADER_FIELDS + self.sequence % self.slots] = self.sequence
+        self.header[5] = self.sequence
+
+    def write(self, frame):
+        self.acquire()[:] = frame
+        self.publish()
+
+    def write_surface(self, surface):
+        """Mirror a pygame surface, its (width, height) pixel view is copied once, transposed"""
+        self.write(pg.surfarray.pixels3d(surface).transpose(1, 0, 2))
+
+    def close(self):
+        del self.header, self.frames
+        self.memory.close()
+        self.memory.unlink()
+        _created.discard(self.memory._name)
+
+
+class FrameReader:
+    """Attaches to a FrameRing from another process and hands out the latest frame without copying"""
+    def __init__(self, name):
+        # Only the creating process may unlink the segment, so the reader must not be tracked.
+        # Before Python 3.13 attaching registers the segment anyway, the registration is dropped
+        # again unless a FrameRing of this process created it and still owns that one entry
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            self.memory = shared_memory.SharedMemory(name=name)
+            if self.memory._name not in _created:
+                resource_tracker.unregister(self.memory._name, "shared_memory")
+        magic, slots = np.ndarray(2, dtype=np.uint64, buffer=self.memory.buf)
+        if magic != MAGIC:
+            raise ValueError(f"{name} is not a frame ring")
+        self.header = np.ndarray(HEADER_FIELDS + int(slots), dtype=np.uint64, buffer=self.memory.buf)
+        _, slots, width, height, channels, _ = self.header[:HEADER_FIELDS].tolist()
+        self.frames = np.ndarray((slots, height, width, channels), dtype=np.uint8, buffer=self.memory.buf, offset=_header_size(slots))
+        self.slots = slots
+
+    def latest(self):
+        """Sequence number and read only view of the newest complete frame, (0, None) before the first one"""
+        sequence = int(self.header[5])
+        if sequence == 0:
+            return 0, None
+        frame = self.frames[sequence % self.slots]
+        frame.flags.writeable = False
+        return sequence, frame
+
+    def valid(self, sequence):
+        """Whether the frame of a sequence number is still intact, check after using its view"""
+        return int(self.header[HEADER_FIELDS + sequence % self.slots]) == sequence
+
+    def close(self):
+        del self.header, self.frames
+        self.memory.close()
+
+
+if __name__ == "__main__":
+    # Example consumer: python shm.py <name>
+    reader = FrameReader(sys.argv[1] if len(sys.argv) > 1 else "metaballs")
+    last = 0
+    try:
+        while True:
+            sequence, frame = reader.latest()
+            if sequence != last and frame is not None:
+                brightness = frame.mean()
+                if reader.valid(sequence):
+                    print(f"frame {sequence}: mean brightness {brightness:.2f}, skipped {sequence - last - 1}")
+                last = sequence
+            time.sleep(0.001)
+    except KeyboardInterrupt:
+        reader.close()
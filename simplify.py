@@ -0,0 +1,51 @@
+import numpy as np
+
+
+# Largest distance in pixels between a dropped point and the simplified polyline
+TOLERANCE = 0.5
+
+
+def douglas_peucker(points, starts, ends, tolerance=TOLERANCE):
+    """Douglas-Peucker over many ranges of one point array at once, returns a keep mask
+
+    Every round finds the farthest interior point from the chord of each open range and
+    splits the ranges where it is farther than the tolerance, so a round costs one pass
+    over the remaining points whatever the number of polylines.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[starts] = keep[ends] = True
+    while len(starts):
+        counts = ends - starts - 1
+        starts, ends, counts = starts[counts > 0], ends[counts > 0], counts[counts > 0]
+        if len(starts) == 0:
+            break
+        owner = np.repeat(np.arange(len(starts)), counts)
+        index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + starts[owner] + 1
+
+        # Distance to the chord as a segment, closed loops have a zero length chord
+        a, b = points[starts][owner], points[ends][owner]
+        direction = b - a
+        length = np.maximum(np.sum(direction**2, axis=1), 1e-12)
+        t = np.clip(np.sum((points[index] - a) * direction, axis=1) / length, 0, 1)
+        distance = np.sum((points[index] - a - t[:, None] * direction) ** 2, axis=1)
+
+        # Farthest point of every range: sorted by range, then by decreasing distance
+        order = np.lexsort((-distance, owner))
+        farthest = order[np.cumsum(counts) - counts]
+        split = distance[farthest] > tolerance**2
+        middle = index[farthest[split]]
+        keep[middle] = True
+        starts, ends = np.concatenate((starts[split], middle)), np.concatenate((middle, ends[split]))
+    return keep
+
+
+def simplify(lines, tolerance=TOLERANCE):
+    """Simplified copies of (P, 2) polylines, closed ones keep their repeated first point"""
+    if not lines:
+        return lines
+    points = np.concatenate(lines)
+    counts = np.array([len(line) for line in lines])
+    starts = np.cumsum(counts) - counts
+    keep = douglas_peucker(points, starts, starts + counts - 1, tolerance)
+    kept = np.add.reduceat(keep, starts)
+    return np.split(points[keep], np.cumsum(kept)[:-1])
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+import numpy as np
+
+import field
+
+
+# Sub-cell positions per axis a sphere centre is rounded to, and the most stencil bytes kept
+SUBDIVISIONS = 8
+CAPACITY = 128 << 20
+
+
+class StencilCache:
+    """Builds the field by adding precomputed per sphere stencils into the grid
+
+    The grid is regular and r / d is the radius times 1 / d, so a sphere's kernel on
+    the grid only depends on where its centre falls inside a cell. Centres are rounded
+    to one of subdivisions**2 sub-cell positions and 1 / d for every position is computed
+    once, over twice the grid minus one cell each way, so any placement covers the whole
+    grid and the field matches evaluate up to the rounding. Every sphere then costs a
+    multiply and an add over the grid instead of a square root and a divide. Stencils
+    are kept in least recently used order up to capacity bytes. Each one holds
+    (2 rows - 1) x (2 cols - 1) float64 values, 0.3 MB on a 10 px grid over 1280 x 720
+    and 7.4 MB on a 2 px grid, where only 18 of the 64 default positions fit.
+    """
+    def __init__(self, xs, ys, subdivisions=SUBDIVISIONS, capacity=CAPACITY):
+        self.xs, self.ys = xs, ys
+        self.size = xs[1] - xs[0]
+        self.subdivisions = subdivisions
+        self.capacity = capacity
+        self.stencils = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stencil(self, fx, fy):
+        """Unit radius kernel of a sphere fx / subdivisions cells right and fy down of the centre vertex"""
+        key = (fx, fy)
+        values = self.stencils.get(key)
+        if values is not None:
+            self.stencils.move_to_end(key)
+            self.hits += 1
+            return values
+        self.misses += 1
+
+        rows, cols = len(self.ys), len(self.xs)
+        dx = (np.arange(-(cols - 1), cols) - fx / self.subdivisions) * self.size
+        dy = (np.arange(-(rows - 1), rows) - fy / self.subdivisions) * self.size
+        values = 1 / (np.sqrt(dy[:, None] ** 2 + dx**2) + field.EPSILON)
+        self.stencils[key] = values
+        self.nbytes += values.nbytes
+        # The newest stencil stays even when it alone is larger than the capacity
+        while self.nbytes > self.capacity and len(self.stencils) > 1:
+            _, evicted = self.stencils.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+        return values
+
+    def evaluate(self, spheres, out=None):
+        """Field of the spheres on the cache's grid, as a (rows, cols) array"""
+        rows, cols = len(self.ys), len(self.xs)
+        values = np.empty((rows, cols)) if out is None else out
+        values.fill(0)
+        origin = np.array([self.xs[0], self.ys[0]])
+        steps = np.rint((spheres[:, :2] - origin) / self.size * self.subdivisions).astype(np.intp)
+        cells, fractions = np.divmod(steps, self.subdivisions)
+        # Centres rounded off the grid are beyond the stencils' reach and use the exact kernel
+        outside = np.any((cells < 0) | (cells >= [cols, rows]), axis=1)
+        if np.any(outside):
+            values += field.evaluate_separable(spheres[outside], self.xs, self.ys)
+        buffer = np.empty_like(values)
+        for (col, row), (fx, fy), radius in zip(cells[~outside].tolist(), fractions[~outside].tolist(), spheres[~outside, 2].tolist()):
+            # Stencil index (rows - 1, cols - 1) lies on the vertex the centre was rounded into
+            top, left = rows - 1 - row, cols - 1 - col
+            np.multiply(self.stencil(fx, fy)[top:top + rows, left:left + cols], radius, out=buffer)
+            values += buffer
+        return values
@@ -0,0 +1,105 @@
+import gc
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+
+# Spans kept, later ones are counted as dropped
+CAPACITY = 1 << 20
+
+# One finished span, times in perf_counter nanoseconds; duration stays -1 until written
+EVENT = np.dtype([
+    ("name", "<i4"),
+    ("thread", "<i8"),
+    ("start", "<i8"),
+    ("duration", "<i8"),
+])
+
+
+class Timeline:
+    """Records the begin and end of named spans per thread and writes them as Chrome trace events
+
+    Spans go into a preallocated record array and names are kept as small integer ids,
+    so recording costs a counter step and one row write with no allocation while the
+    program runs; the JSON is only built in write. Garbage collections are recorded
+    as spans of their own. Load the output in Perfetto or chrome://tracing.
+    """
+    def __init__(self, capacity=CAPACITY, collections=True):
+        self.events = np.zeros(capacity, dtype=EVENT)
+        self.events["duration"] = -1
+        self.counter = itertools.count()
+        self.names = {}
+        self.threads = {}
+        self.dropped = 0
+        self.origin = time.perf_counter_ns()
+        self.collection_start = None
+        self.collections = collections
+        if collections:
+            gc.callbacks.append(self.collection)
+
+    def record(self, name, start, stop=None):
+        """Store a span that started at a perf_counter_ns time and ends now or at stop"""
+        if stop is None:
+            stop = time.perf_counter_ns()
+        index = next(self.counter)
+        if index >= len(self.events):
+            self.dropped += 1
+            return
+        thread = threading.get_ident()
+        if thread not in self.threads:
+            self.threads[thread] = threading.current_thread().name
+        name_id = self.names.setdefault(name, len(self.names))
+        self.events[index] = (name_id, thread, start, stop - start)
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def collection(self, phase, info):
+        """gc callback, collections run on the thread whose allocation triggered them"""
+        if phase == "start":
+            self.collection_start = time.perf_counter_ns()
+        elif self.collection_start is not None:
+            self.record(f"gc generation {info['generation']}", self.collection_start)
+            self.collection_start = None
+
+    def trace_events(self):
+        """All recorded spans as complete ("X") trace events plus thread name metadata"""
+        events = self.events[self.events["duration"] >= 0]
+        names = sorted(self.names, key=self.names.get)
+        pid = os.getpid()
+        # Trace event times are microseconds
+        starts = ((events["start"] - self.origin) / 1000).tolist()
+        durations = (events["duration"] / 1000).tolist()
+        trace = [
+            {"name": names[name], "cat": "stage", "ph": "X", "ts": start, "dur": duration, "pid": pid, "tid": thread}
+            for name, thread, start, duration in zip(events["name"].tolist(), events["thread"].tolist(), starts, durations)
+        ]
+        trace += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}}
+            for thread, name in self.threads.items()
+        ]
+        return trace
+
+    def write(self, path):
+        with open(path, "w") as file:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms", "otherData": {"dropped": self.dropped}}, file)
+
+    def close(self, path=None):
+        if self.collections and self.collection in gc.callbacks:
+            gc.callbacks.remove(self.collection)
+        if path is not None:
+            self.write(path)
+
+
+def span(timeline, name):
+    """timeline.span(name), or a context doing nothing without a timeline"""
+    return nullcontext() if timeline is None else timeline.span(name)
@@ -0,0 +1,196 @@
+import numpy as np
+
+import contour
+import field
+
+
+# Neighbour across each local edge (top, right, bottom, left) and the edge it enters by
+NEIGHBOURS = ((-1, 0), (0, 1), (1, 0), (0, -1))
+OPPOSITE = (2, 3, 0, 1)
+# Vertices at both ends of each local edge, relative to the cell's top-left vertex
+EDGE_VERTICES = (((0, 0), (0, 1)), ((0, 1), (1, 1)), ((1, 0), (1, 1)), ((0, 0), (1, 0)))
+# Ray directions used to seed from each sphere, as (row, col) steps
+RAYS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+# contour's case tables as nested lists, indexing numpy arrays one entry at a time is slow
+SEGMENT_COUNT = contour.SEGMENT_COUNT.tolist()
+SEGMENT_START = contour.SEGMENT_START.tolist()
+SEGMENT_END = contour.SEGMENT_END.tolist()
+# Side of the aligned vertex blocks evaluated together the first time one of their vertices is needed
+BLOCK = 8
+
+
+class Tracer:
+    """Follows isolines cell by cell from seeds near each sphere, evaluating vertices lazily
+
+    Vertices are evaluated a block x block group at a time with field.evaluate, so a
+    ray step or a cell's missing corners load their neighbours along with them and the
+    walk mostly reads values that are already there.
+    """
+    def __init__(self, spheres, xs, ys, threshold, block=BLOCK):
+        self.state = np.asarray(spheres, dtype=np.float64)
+        self.spheres = [tuple(sphere) for sphere in self.state.tolist()]
+        self.xs, self.ys = xs, ys
+        self.threshold = threshold
+        self.block = block
+        self.n_rows, self.n_cols = len(ys) - 1, len(xs) - 1
+        self.values = [[None] * (self.n_cols + 1) for _ in range(self.n_rows + 1)]
+        self.evaluated = 0
+        self.codes = {}
+        self.visited = set()
+        self.perimeter = None
+
+    def load(self, row, col):
+        """Evaluate the block holding a vertex"""
+        r0, c0 = row - row % self.block, col - col % self.block
+        r1, c1 = min(r0 + self.block, self.n_rows + 1), min(c0 + self.block, self.n_cols + 1)
+        values = field.evaluate(self.state, self.xs[c0:c1], self.ys[r0:r1])
+        for r, block_row in enumerate(values.tolist(), r0):
+            self.values[r][c0:c1] = block_row
+        self.evaluated += values.size
+
+    def value(self, row, col):
+        value = self.values[row][col]
+        if value is None:
+            self.load(row, col)
+            value = self.values[row][col]
+        return value
+
+    def inside(self, row, col):
+        return self.value(row, col) >= self.threshold
+
+    def code(self, row, col):
+        key = (row, col)
+        if key not in self.codes:
+            corners = (self.value(row, col), self.value(row, col + 1), self.value(row + 1, col + 1), self.value(row + 1, col))
+            code = sum(1 << i for i, value in enumerate(corners) if value >= self.threshold)
+            if code in (5, 10) and sum(corners) / 4 >= self.threshold:
+                code += 16
+            self.codes[key] = code
+        return self.codes[key]
+
+    def segment(self, row, col, local, at_start):
+        """Index of the segment in a cell that starts (or ends) at a local edge, or None"""
+        code = self.code(row, col)
+        table = SEGMENT_START if at_start else SEGMENT_END
+        for k in range(SEGMENT_COUNT[code]):
+            if table[code][k] == local:
+                return k
+        return None
+
+    def point(self, row, col, local):
+        (r0, c0), (r1, c1) = EDGE_VERTICES[local]
+        f0, f1 = self.value(row + r0, col + c0), self.value(row + r1, col + c1)
+        t = (self.threshold - f0) / (f1 - f0)
+        x0, y0 = self.xs[col + c0], self.ys[row + r0]
+        return (x0 + (self.xs[col + c1] - x0) * t, y0 + (self.ys[row + r1] - y0) * t)
+
+    def in_grid(self, row, col):
+        return 0 <= row < self.n_rows and 0 <= col < self.n_cols
+
+    def walk(self, row, col, k, forward):
+        """Follow the isoline from a segment until it closes or leaves the grid"""
+        points = []
+        start = (row, col, k)
+        while True:
+            self.visited.add((row, col, k))
+            code = self.code(row, col)
+            local = (SEGMENT_END if forward else SEGMENT_START)[code][k]
+            points.append(self.point(row, col, local))
+
+            d_row, d_col = NEIGHBOURS[local]
+            row, col = row + d_row, col + d_col
+            if not self.in_grid(row, col):
+                return points, False
+            k = self.segment(row, col, OPPOSITE[local], forward)
+            if (row, col, k) == start:
+                return points, True
+            if (row, col, k) in self.visited:
+                return points, False
+
+    def trace_from(self, row, col, k):
+        """Polyline through a segment, walked both ways when it does not close"""
+        code = self.code(row, col)
+        first = self.point(row, col, SEGMENT_START[code][k])
+        forward, closed = self.walk(row, col, k, True)
+        if closed:
+            return [first] + forward, True
+
+        local = SEGMENT_START[code][k]
+        d_row, d_col = NEIGHBOURS[local]
+        backward = []
+        if self.in_grid(row + d_row, col + d_col):
+            previous = self.segment(row + d_row, col + d_col, OPPOSITE[local], False)
+            if (row + d_row, col + d_col, previous) not in self.visited:
+                backward, _ = self.walk(row + d_row, col + d_col, previous, False)
+        return backward[::-1] + [first] + forward, False
+
+    def seeds(self):
+        """Crossed edges found by stepping outward from every sphere centre along the grid axes"""
+        size_x, size_y = self.xs[1] - self.xs[0], self.ys[1] - self.ys[0]
+        for sx, sy, _ in self.spheres:
+            row = min(max(int(round((sy - self.ys[0]) / size_y)), 0), self.n_rows)
+            col = min(max(int(round((sx - self.xs[0]) / size_x)), 0), self.n_cols)
+            for d_row, d_col in RAYS:
+                r, c = row, col
+                while 0 <= r + d_row <= self.n_rows and 0 <= c + d_col <= self.n_cols:
+                    if self.inside(r, c) != self.inside(r + d_row, c + d_col):
+                        yield r, c, d_row, d_col
+                        break
+                    r, c = r + d_row, c + d_col
+                else:
+                    # The ray left the blob through the border, its isoline may still cross the border elsewhere
+                    if self.inside(r, c):
+                        yield from self.border_seeds(r, c)
+
+    def border(self):
+        """Grid border vertices in clockwise order, consecutive ones are adjacent"""
+        top = [(0, c) for c in range(self.n_cols)]
+        right = [(r, self.n_cols) for r in range(self.n_rows)]
+        bottom = [(self.n_rows, c) for c in range(self.n_cols, 0, -1)]
+        left = [(r, 0) for r in range(self.n_rows, 0, -1)]
+        return top + right + bottom + left
+
+    def border_seeds(self, row, col):
+        """First crossed border edge in each direction from a border vertex"""
+        if self.perimeter is None:
+            self.perimeter = self.border()
+            self.position = {vertex: i for i, vertex in enumerate(self.perimeter)}
+        n = len(self.perimeter)
+        start = self.position[(row, col)]
+        for step in (1, -1):
+            for i in range(n):
+                (r0, c0), (r1, c1) = self.perimeter[(start + i * step) % n], self.perimeter[(start + (i + 1) * step) % n]
+                if self.inside(r0, c0) != self.inside(r1, c1):
+                    yield r0, c0, r1 - r0, c1 - c0
+                    break
+
+    def trace(self):
+        """All isolines reachable from the seeds, as (lines, closed) like contour.polylines"""
+        lines, closed = [], []
+        for r, c, d_row, d_col in self.seeds():
+            # The crossed edge is shared by two cells, either one holds a segment touching it
+            if d_col:
+                c = min(c, c + d_col)
+                candidates = ((r, c, 0), (r - 1, c, 2))
+            else:
+                r = min(r, r + d_row)
+                candidates = ((r, c, 3), (r, c - 1, 1))
+            for row, col, local in candidates:
+                if not self.in_grid(row, col):
+                    continue
+                k = self.segment(row, col, local, True)
+                if k is None:
+                    k = self.segment(row, col, local, False)
+                if (row, col, k) not in self.visited:
+                    line, is_closed = self.trace_from(row, col, k)
+                    lines.append(np.array(line))
+                    closed.append(is_closed)
+                break
+        return lines, closed
+
+
+def polylines(spheres, xs, ys, threshold):
+    """Isolines found by contour following, with the number of vertices evaluated"""
+    tracer = Tracer(spheres, xs, ys, threshold)
+    lines, closed = tracer.trace()
+    return lines, closed, tracer.evaluated
@@ -0,0 +1,86 @@
+import numpy as np
+
+import field
+import bounds
+
+
+# Tile side in vertices sharing one sphere order, and spheres added per classification round
+TILE = 8
+BATCH = 8
+
+
+def classify(spheres, xs, ys, thresholds, tile=TILE, batch=BATCH):
+    """First phase: partial sums per vertex in descending contribution order, stopping early
+
+    The vertices are split into tile x tile blocks, each vertex in exactly one, and
+    spheres are ordered per block by their largest possible contribution. A block stops
+    as soon as no threshold lies between its smallest partial sum and its largest plus
+    the bound of the spheres not yet added, so blocks the isoline crosses run to the
+    end. Within a block dx only depends on the column and dy on the row, so every round
+    is a dense (blocks, batch, tile, tile) kernel over the blocks still running. Returns
+    the partial sums and the number of sphere contributions computed.
+    """
+    thresholds = np.sort(np.atleast_1d(thresholds))
+    # Vertex indices of every block row and column, the last ones clamped to the grid
+    block_rows = np.minimum(np.arange(0, len(ys), tile)[:, None] + np.arange(tile), len(ys) - 1)
+    block_cols = np.minimum(np.arange(0, len(xs), tile)[:, None] + np.arange(tile), len(xs) - 1)
+    rows = np.repeat(block_rows, len(block_cols), axis=0)
+    cols = np.tile(block_cols, (len(block_rows), 1))
+    bx, by = xs[cols], ys[rows]
+    _, upper = bounds.sphere_bounds(spheres, bx[:, 0], bx[:, -1], by[:, 0], by[:, -1])
+
+    order = np.argsort(-upper, axis=1)
+    upper = np.take_along_axis(upper, order, axis=1)
+    # remainder[:, k] bounds what the spheres from position k on can still add
+    remainder = np.concatenate((np.cumsum(upper[:, ::-1], axis=1)[:, ::-1], np.zeros((len(upper), 1))), axis=1)
+    ordered = spheres[order]
+
+    values = np.empty((len(ys), len(xs)))
+    pending = np.arange(len(order))
+    partial = np.zeros((len(order), tile, tile))
+    computed = 0
+    for start in range(0, len(spheres), batch):
+        # A block whose partial sums and their reach share one level has every vertex decided
+        low, high = partial.min(axis=(1, 2)), partial.max(axis=(1, 2)) + remainder[pending, start]
+        running = np.searchsorted(thresholds, high, "right") > np.searchsorted(thresholds, low, "left")
+        if not running.all():
+            done = pending[~running]
+            values[rows[done, :, None], cols[done, None, :]] = partial[~running]
+            pending, partial = pending[running], partial[running]
+        if len(pending) == 0:
+            break
+
+        chosen = ordered[pending, start:start + batch]
+        dx2 = (bx[pending, None, :] - chosen[..., 0, None]) ** 2
+        dy2 = (by[pending, None, :] - chosen[..., 1, None]) ** 2
+        distance = dy2[..., :, None] + dx2[..., None, :]
+        np.sqrt(distance, out=distance)
+        distance += field.EPSILON
+        np.divide(chosen[..., 2, None, None], distance, out=distance)
+        partial += np.sum(distance, axis=1)
+        computed += distance.size
+    values[rows[pending, :, None], cols[pending, None, :]] = partial
+    return values, computed
+
+
+def evaluate(spheres, xs, ys, thresholds, tile=TILE, batch=BATCH):
+    """Two phase field: early exit classification, then exact sums only around sign changes
+
+    Vertices away from every crossing keep their partial sum, which lies on the same
+    side of every threshold as the exact value. Returns the field, the number of
+    first phase contributions and the number of exactly evaluated vertices.
+    """
+    values, computed = classify(spheres, xs, ys, thresholds, tile, batch)
+
+    level = np.searchsorted(np.sort(np.atleast_1d(thresholds)), values, "right")
+    active = np.zeros(values.shape, dtype=bool)
+    horizontal = level[:, 1:] != level[:, :-1]
+    vertical = level[1:, :] != level[:-1, :]
+    active[:, 1:] |= horizontal
+    active[:, :-1] |= horizontal
+    active[1:, :] |= vertical
+    active[:-1, :] |= vertical
+
+    index = np.nonzero(active)
+    values[index] = field.evaluate_points(spheres, np.column_stack((xs[index[1]], ys[index[0]])))
+    return values, computed, len(index[0])
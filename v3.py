@@ -245,6 +245,8 @@ class MarchinSquare:
             pg.display.flip()
         
 
-              
-marchinSquare = MarchinSquare()
-marchinSquare.run()
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    marchinSquare = MarchinSquare()
+    marchinSquare.run()
\ No newline at end of file
@@ -0,0 +1,323 @@
+import pygame as pg
+from pygame.locals import *
+import sys
+import math
+import time
+import numpy as np
+
+import field
+import contour
+import bounds
+import twophase
+import refine
+import tracing
+from rasterize import Rasterizer, polyline_segments
+from export import SvgExporter, GeoJsonExporter, BinaryExporter
+from shm import FrameRing
+from metrics import MetricsWriter
+from query import ContourQuery
+from narrowband import NarrowBand
+from splat import StencilCache
+from timeline import Timeline, span
+import attraction
+from primitives import Primitives
+import simplify
+import blobs
+import sdf
+import world
+from v3 import Spheres, WIDTH, HEIGHT, FPS, BLACK, GREEN, GRAY
+
+
+# Voxel variables
+SQUARE_SIZE = 10
+THRESHOLD = 2
+
+# Spheres pull on each other through a Barnes-Hut quadtree instead of moving in straight lines
+ATTRACTION = False
+
+# Simulate world.WORLD_WIDTH x world.WORLD_HEIGHT instead of the screen and look at it through a
+# camera (drag to pan, wheel to zoom), only spheres near the view feed the field
+WORLD = False
+
+# Static capsules, ellipses and boxes blended into the spheres' field, evaluated once on the grid
+# and included in refinement (FIELD "exact" or "splat" only, the other modes reject them), e.g.
+# PRIMITIVES = Primitives(); PRIMITIVES.add_capsule(200, 300, 600, 300, 40); PRIMITIVES.add_box(400, 150, 80, 30)
+PRIMITIVES = None
+
+# Contour levels, all extracted from one field evaluation
+THRESHOLDS = [THRESHOLD]
+FILL_BANDS = False
+# Relative amplitude of the threshold animation, only the contours are rebuilt for it
+PULSE = 0.0
+PULSE_PERIOD = 2
+
+# Field evaluation: "exact", "bounds" (skip tiles the isoline cannot cross; slower than
+# "exact" on the default 10 px grid, faster from 5 px down, see README), "twophase"
+# (early exit classification, exact sums only next to crossings; only breaks even with
+# "exact" on fine grids with few spheres, see README) or "narrowband" (only the
+# tiles around the previous frame's contour; slower than "exact" with the default 15
+# spheres, faster from about 60 spheres on a 5 px grid). The last three only classify correctly for
+# the thresholds they were built for, so their field is never reused.
+# "tracing" follows each isoline from the spheres outward and only evaluates the vertices
+# around it, there is no field to fill bands or refine crossings from. Its per cell walk
+# is still slower than "exact" at these grid sizes (see README).
+# "splat" adds cached kernel stencils with sphere centres rounded to a sub-cell position.
+FIELD = "exact"
+
+# Newton steps moving crossings onto the exact isoline, and projected midpoints inserted per
+# segment, so coarse grids keep a smooth outline at a cost proportional to the contour length
+REFINE_STEPS = 0
+SUBDIVISIONS = 0
+
+# Label the blobs of the first threshold every frame and print when they merge or split (needs a field)
+TRACK_BLOBS = False
+
+# Hit test the mouse cursor against the first threshold's blobs every frame and show it in the caption
+QUERY = False
+
+# Douglas-Peucker tolerance in pixels applied to the chained contours before drawing and export, or None
+SIMPLIFY = None
+
+# Draw all segments with the NumPy rasterizer instead of pg.draw calls, slower than pg.draw.lines (see README)
+RASTER = False
+LINE_WIDTH = 3
+ANTIALIAS = True
+
+# Draw a glow around the first threshold's contours from a signed distance field (needs a field)
+GLOW = False
+GLOW_SCALE = sdf.SCALE
+
+# Export variables: None, "svg", "geojson" or "bin"
+EXPORT = None
+EXPORT_PATH = "contours"
+
+# File receiving area, perimeter, centroid and bounding box records of every contour, or None
+METRICS_PATH = None
+
+# Name of a shared memory frame ring mirroring every rendered frame for local consumers, or None
+SHARED_MEMORY = None
+
+# Chrome trace event file (Perfetto, chrome://tracing) receiving a span per stage and frame, or None
+TRACE_PATH = None
+
+
+def make_exporter(kind, path):
+    if kind == "svg":
+        return SvgExporter(path + ".svg", WIDTH, HEIGHT)
+    if kind == "geojson":
+        return GeoJsonExporter(path + ".geojson")
+    if kind == "bin":
+        return BinaryExporter(path + ".bin")
+    return None
+
+
+class Squares:
+    def __init__(self, timeline=None):
+        if PRIMITIVES is not None and FIELD not in ("exact", "splat"):
+            raise ValueError(f"PRIMITIVES need FIELD \"exact\" or \"splat\", \"{FIELD}\" does not evaluate them")
+        self.xs, self.ys = field.grid(WIDTH, HEIGHT, SQUARE_SIZE)
+        self.field = None
+        self.state = None
+        self.levels = []
+        self.bands = []
+        self.lines, self.closed = [], []
+        self.rasterizer = Rasterizer(WIDTH, HEIGHT) if RASTER else None
+        self.narrowband = NarrowBand(self.xs, self.ys) if FIELD == "narrowband" else None
+        self.splat = StencilCache(self.xs, self.ys) if FIELD == "splat" else None
+        self.static = PRIMITIVES.evaluate(self.xs, self.ys) if PRIMITIVES is not None else None
+        self.tracker = blobs.Tracker() if TRACK_BLOBS else None
+        self.glow = sdf.glow_table(GREEN) if GLOW else None
+        self.threshold = None
+        self.timeline = timeline
+        # Points before and after simplification, and the time it took in ms
+        self.simplified = (0, 0, 0.0)
+
+    def update(self, spheres, thresholds):
+        self.state = spheres.spheres.copy()
+        if FIELD == "tracing":
+            with span(self.timeline, "tracing"):
+                self.field = None
+                self.levels = [tracing.polylines(self.state, self.xs, self.ys, threshold)[:2] for threshold in thresholds]
+                self.simplify()
+                self.bands = []
+            return
+        with span(self.timeline, "field"):
+            if FIELD == "bounds":
+                self.field, _ = bounds.evaluate(spheres.spheres, self.xs, self.ys, thresholds)
+            elif FIELD == "twophase":
+                self.field, _, _ = twophase.evaluate(spheres.spheres, self.xs, self.ys, thresholds)
+            elif FIELD == "narrowband":
+                self.field, _ = self.narrowband.update(spheres.spheres, thresholds)
+            elif FIELD == "splat":
+                self.field = self.splat.evaluate(spheres.spheres)
+                if self.static is not None:
+                    self.field += self.static
+            else:
+                self.field = field.evaluate_separable(spheres.spheres, self.xs, self.ys)
+                if self.static is not None:
+                    self.field += self.static
+        if self.tracker is not None:
+            with span(self.timeline, "blobs"):
+                _, events = self.tracker.update(self.field, thresholds[0])
+            for kind, before, after in events:
+                if kind in ("merge", "split"):
+                    print(f"{kind}: {before} -> {after}")
+        self.contour(thresholds)
+
+    def contour(self, thresholds):
+        """Rebuild the contours of the cached field for new thresholds"""
+        self.threshold = thresholds[0]
+        with span(self.timeline, "contour"):
+            locate = refine.locator(self.state, REFINE_STEPS, static=PRIMITIVES) if REFINE_STEPS else contour.edge_points
+            self.levels = contour.multi_polylines(self.field, thresholds, self.xs, self.ys, locate)
+            for _ in range(SUBDIVISIONS):
+                self.levels = [
+                    (refine.subdivide_lines(self.state, lines, threshold, max(REFINE_STEPS, 1), PRIMITIVES), closed)
+                    for threshold, (lines, closed) in zip(thresholds, self.levels)
+                ]
+            self.simplify()
+        if FILL_BANDS:
+            with span(self.timeline, "bands"):
+                self.bands = contour.isobands(self.field, thresholds, self.xs, self.ys)
+        else:
+            self.bands = []
+
+    def simplify(self):
+        if SIMPLIFY is not None:
+            start = time.time()
+            before = sum(len(line) for lines, _ in self.levels for line in lines)
+            self.levels = [(simplify.simplify(lines, SIMPLIFY), closed) for lines, closed in self.levels]
+            after = sum(len(line) for lines, _ in self.levels for line in lines)
+            self.simplified = (before, after, (time.time() - start) * 1000)
+        self.lines, self.closed = self.levels[0]
+
+    def draw(self, surface):
+        if self.glow is not None and self.field is not None:
+            distance = sdf.signed_distance(self.field, self.threshold, self.xs, self.ys, polyline_segments(self.lines), WIDTH, HEIGHT, GLOW_SCALE)
+            sdf.blit(surface, distance, self.glow, GLOW_SCALE)
+
+        for points, counts in self.bands:
+            for polygon in np.split(points, np.cumsum(counts)[:-1]):
+                pg.draw.polygon(surface, GRAY, polygon)
+
+        if self.rasterizer is not None:
+            self.rasterizer.clear()
+            self.rasterizer.draw(polyline_segments([line for lines, _ in self.levels for line in lines]), LINE_WIDTH, ANTIALIAS)
+            # Blended into the surface in place, over whatever glow or bands were drawn first
+            self.rasterizer.blit(surface, GREEN, None)
+            return
+
+        for lines, _ in self.levels:
+            for line in lines:
+                pg.draw.lines(surface, GREEN, False, line, LINE_WIDTH)
+
+
+class MarchinSquare:
+    def __init__(self):
+        pg.init()
+
+        self.screen = pg.display.set_mode((WIDTH, HEIGHT))
+        self.clock = pg.time.Clock()
+        self.surface = pg.display.get_surface()
+
+        if WORLD:
+            self.spheres = world.Spheres()
+            self.camera = world.Camera((world.WORLD_WIDTH - WIDTH) / 2, (world.WORLD_HEIGHT - HEIGHT) / 2)
+            self.viewport = world.Viewport(self.spheres, self.camera)
+        else:
+            self.spheres = attraction.Spheres() if ATTRACTION else Spheres()
+            self.viewport = None
+        self.timeline = Timeline() if TRACE_PATH else None
+        self.squares = Squares(self.timeline)
+        self.exporter = make_exporter(EXPORT, EXPORT_PATH)
+        self.ring = FrameRing(SHARED_MEMORY, WIDTH, HEIGHT) if SHARED_MEMORY else None
+        self.metrics = MetricsWriter(METRICS_PATH) if METRICS_PATH else None
+        self.paused = False
+        self.start_time = time.time()
+
+    def quit(self):
+        if self.exporter is not None:
+            self.exporter.close()
+        if self.ring is not None:
+            self.ring.close()
+        if self.metrics is not None:
+            self.metrics.close()
+        if self.timeline is not None:
+            self.timeline.close(TRACE_PATH)
+        pg.quit()
+        sys.exit()
+
+    def run(self):
+        while True:
+            with span(self.timeline, "tick"):
+                elapsed_time = self.clock.tick(FPS) / 1000
+            frame_start_time = time.perf_counter_ns()
+
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    self.quit()
+                elif event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
+                    self.paused = not self.paused
+                elif WORLD and event.type == pg.MOUSEMOTION and event.buttons[0]:
+                    self.camera.pan(*event.rel)
+                elif WORLD and event.type == pg.MOUSEWHEEL:
+                    self.camera.zoom_at(1.1**event.y, *pg.mouse.get_pos())
+
+            self.screen.fill(BLACK)
+
+            phase = 2 * math.pi * (time.time() - self.start_time) / PULSE_PERIOD
+            thresholds = [threshold * (1 + PULSE * math.sin(phase)) for threshold in THRESHOLDS]
+
+            update_start_time = time.time()
+            if self.paused and FIELD in ("exact", "splat") and not WORLD:
+                self.squares.contour(thresholds)
+            else:
+                if not self.paused:
+                    with span(self.timeline, "sphere update"):
+                        self.spheres.update(elapsed_time)
+                if WORLD:
+                    # The camera may move while paused, so the view is culled again every frame
+                    with span(self.timeline, "cull"):
+                        self.viewport.update(0 if self.paused else elapsed_time)
+                    self.squares.update(self.viewport, thresholds)
+                else:
+                    self.squares.update(self.spheres, thresholds)
+            update_end_time = time.time()
+
+            draw_start_time = time.time()
+            with span(self.timeline, "draw"):
+                self.squares.draw(self.surface)
+            draw_end_time = time.time()
+
+            with span(self.timeline, "output"):
+                if self.exporter is not None:
+                    self.exporter.write(self.squares.lines, self.squares.closed)
+                if self.metrics is not None:
+                    self.metrics.write(self.squares.lines, self.squares.closed)
+                if self.ring is not None:
+                    self.ring.write_surface(self.surface)
+
+            update_time = (update_end_time - update_start_time) * 1000
+            draw_time = (draw_end_time - draw_start_time) * 1000
+            caption = f"Simulation - FPS: {self.clock.get_fps():.1f} - Update Time: {update_time:.2f}ms - Draw Time: {draw_time:.2f}ms"
+            if QUERY and self.squares.field is not None:
+                query = ContourQuery(self.squares.field, thresholds[0], self.squares.xs, self.squares.ys, polyline_segments(self.squares.lines))
+                cursor = np.array([pg.mouse.get_pos()], dtype=np.float64)
+                side = "inside" if query.inside(cursor)[0] else "outside"
+                caption += f" - Cursor: {side}, {query.distance(cursor)[0]:.1f}px from edge"
+            if SIMPLIFY is not None:
+                before, after, simplify_time = self.squares.simplified
+                caption += f" - Points: {before} -> {after} ({simplify_time:.2f}ms)"
+            if FIELD == "splat":
+                caption += f" - Stencil hits: {self.squares.splat.hit_rate:.1%}"
+            pg.display.set_caption(caption)
+
+            with span(self.timeline, "flip"):
+                pg.display.flip()
+            if self.timeline is not None:
+                self.timeline.record("frame", frame_start_time)
+
+
+if __name__ == "__main__":
+    marchinSquare = MarchinSquare()
+    marchinSquare.run()
@@ -0,0 +1,156 @@
+import numpy as np
+
+import v3
+
+
+# World variables, the screen only shows the part the camera looks at. The field of
+# r / d adds up over every sphere around, so the world keeps about the sphere density
+# of Version 3's screen, denser worlds lie above the threshold almost everywhere.
+WORLD_WIDTH = 100_000
+WORLD_HEIGHT = 100_000
+WORLD_SPHERES = 100_000
+
+# Spheres farther than INFLUENCE radii from the view are left out of the field, each
+# would add less than 1 / INFLUENCE to it
+INFLUENCE = 8
+# Side of the spatial index buckets in world pixels, and frames between index rebuilds
+BUCKET_SIZE = 256
+REBUILD_EVERY = 30
+
+MIN_ZOOM = 0.5
+MAX_ZOOM = 8
+
+
+class Spheres(v3.Spheres):
+    """Spheres bouncing inside a world of any size, same layout as v3.Spheres"""
+    def __init__(self, num_spheres=WORLD_SPHERES, width=WORLD_WIDTH, height=WORLD_HEIGHT):
+        self.width, self.height = width, height
+        self.spheres = np.column_stack((
+            np.random.rand(num_spheres) * width,
+            np.random.rand(num_spheres) * height,
+            v3.MIN_RADIUS + np.random.rand(num_spheres) * (v3.MAX_RADIUS - v3.MIN_RADIUS),
+        ))
+        self.velocities = np.random.rand(num_spheres, 2) * v3.MAX_VEL
+
+    def update(self, elapsed_time):
+        self.spheres[:, 0:2] += self.velocities * elapsed_time
+
+        x_collision = ((self.spheres[:, 0] >= self.width) & (self.velocities[:, 0] > 0)) | ((self.spheres[:, 0] <= 0) & (self.velocities[:, 0] < 0))
+        self.velocities[x_collision, 0] *= -1
+
+        y_collision = ((self.spheres[:, 1] >= self.height) & (self.velocities[:, 1] > 0)) | ((self.spheres[:, 1] <= 0) & (self.velocities[:, 1] < 0))
+        self.velocities[y_collision, 1] *= -1
+
+
+def radix_argsort(keys):
+    """Stable argsort of non-negative integer keys, 16 bits at a time
+
+    numpy sorts uint16 keys with a linear time radix sort, so every 16 bit digit is one
+    stable pass, least significant first, instead of a comparison sort of the whole key.
+    """
+    order = np.argsort((keys & 0xFFFF).astype(np.uint16), kind="stable")
+    largest = int(keys.max(initial=0))
+    shift = 16
+    while largest >> shift:
+        digit = ((keys[order] >> shift) & 0xFFFF).astype(np.uint16)
+        order = order[np.argsort(digit, kind="stable")]
+        shift += 16
+    return order
+
+
+class SpatialIndex:
+    """Uniform bucket grid over (N, 2) points, stored as point ids sorted by bucket with an offset per bucket
+
+    Buckets are numbered row by row, so the buckets of one row of a box are a single
+    slice of ids. Building is a counting sort: a radix sort of the bucket keys and the
+    offsets from a bincount, both linear in the points and buckets.
+    """
+    def __init__(self, points, width, height, bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.buckets = np.array([int(np.ceil(width / bucket_size)), int(np.ceil(height / bucket_size))])
+        cells = self.bucket_of(points)
+        keys = cells[:, 1] * self.buckets[0] + cells[:, 0]
+        self.ids = radix_argsort(keys)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=self.buckets.prod()))))
+
+    def bucket_of(self, points):
+        # Truncation only differs from floor below 0, which the clip maps to 0 either way
+        return np.clip((points * (1 / self.bucket_size)).astype(np.intp), 0, self.buckets - 1)
+
+    def query(self, x0, y0, x1, y1):
+        """Ids of the points in all buckets touching the box, a superset of the points inside it"""
+        (c0, r0), (c1, r1) = self.bucket_of(np.array([[x0, y0], [x1, y1]]))
+        slices = [
+            self.ids[self.offsets[row * self.buckets[0] + c0]:self.offsets[row * self.buckets[0] + c1 + 1]]
+            for row in range(r0, r1 + 1)
+        ]
+        return np.concatenate(slices)
+
+
+class Camera:
+    """Maps world coordinates to the screen: screen = (world - (x, y)) * zoom"""
+    def __init__(self, x=0.0, y=0.0, zoom=1.0, width=v3.WIDTH, height=v3.HEIGHT):
+        self.x, self.y, self.zoom = x, y, zoom
+        self.width, self.height = width, height
+
+    def view(self):
+        """World box (x0, y0, x1, y1) shown on the screen"""
+        return self.x, self.y, self.x + self.width / self.zoom, self.y + self.height / self.zoom
+
+    def to_screen(self, points):
+        return (points - [self.x, self.y]) * self.zoom
+
+    def to_world(self, points):
+        return np.asarray(points) / self.zoom + [self.x, self.y]
+
+    def pan(self, dx, dy):
+        """Move the view by a screen distance, as when dragging the world by it"""
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+
+    def zoom_at(self, factor, screen_x, screen_y):
+        """Scale the zoom by factor, keeping the world point under the screen position in place"""
+        world_x, world_y = self.to_world((screen_x, screen_y))
+        self.zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        self.x, self.y = world_x - screen_x / self.zoom, world_y - screen_y / self.zoom
+
+
+class Viewport:
+    """The spheres influencing the camera's view, in screen coordinates
+
+    Looks like a v3.Spheres to the field code: spheres holds [x, y, radius] rows with
+    positions and radii scaled by the zoom, which leaves r / d unchanged. The index is
+    only rebuilt every rebuild_every frames; in between, spheres may have moved up to
+    their top speed times the time since, so queries reach that much farther and the
+    exact test runs on the current positions. Work per frame then follows the number
+    of candidates near the view, not the size of the world.
+    """
+    def __init__(self, world, camera, influence=INFLUENCE, rebuild_every=REBUILD_EVERY):
+        self.world, self.camera = world, camera
+        self.influence = influence
+        self.rebuild_every = rebuild_every
+        self.index = None
+        self.frames = self.age = 0
+        self.spheres = np.empty((0, 3))
+        self.ids = np.empty(0, dtype=np.intp)
+
+    def update(self, elapsed_time):
+        if self.index is None or self.frames >= self.rebuild_every:
+            self.index = SpatialIndex(self.world.spheres[:, :2], self.world.width, self.world.height)
+            self.frames = self.age = 0
+        self.frames += 1
+        self.age += elapsed_time
+
+        # Velocity components are at most MAX_VEL each
+        slack = v3.MAX_VEL * np.sqrt(2) * self.age
+        reach = self.influence * v3.MAX_RADIUS + slack
+        x0, y0, x1, y1 = self.camera.view()
+        candidates = self.index.query(x0 - reach, y0 - reach, x1 + reach, y1 + reach)
+
+        spheres = self.world.spheres[candidates]
+        gap_x = np.maximum(np.maximum(x0 - spheres[:, 0], spheres[:, 0] - x1), 0)
+        gap_y = np.maximum(np.maximum(y0 - spheres[:, 1], spheres[:, 1] - y1), 0)
+        near = gap_x**2 + gap_y**2 <= (self.influence * spheres[:, 2]) ** 2
+        self.ids = candidates[near]
+        spheres = spheres[near]
+        self.spheres = np.column_stack((self.camera.to_screen(spheres[:, :2]), spheres[:, 2] * self.camera.zoom))